@@ -1,8 +1,71 @@
 import sqlite3
 import os
-import zipfile
 import csv
-from datetime import datetime
+import json
+import re
+from datetime import datetime, timedelta
+
+# ----------------------------
+# 0. Roster change listeners
+# ----------------------------
+_roster_listeners = []
+
+def create_roster_version(cursor):
+    """
+    Creates the one-row roster version table and the triggers that bump it
+    in the same transaction as every write to the students table, whichever
+    process or code path makes it.
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS roster_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO roster_version (id, version) VALUES (1, 0)")
+    for event in ("INSERT", "DELETE", "UPDATE"):
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS roster_version_{event.lower()} AFTER {event} ON students
+        BEGIN UPDATE roster_version SET version = version + 1 WHERE id = 1; END
+        """)
+
+def get_roster_version():
+    """
+    Returns a counter that is bumped on every write to the students table.
+    It lives in the database, so every worker process sees the same value.
+    """
+    conn = sqlite3.connect("attendance_demo.db")
+    try:
+        return conn.execute("SELECT version FROM roster_version WHERE id = 1").fetchone()[0]
+    finally:
+        conn.close()
+
+def on_roster_change(callback):
+    """
+    Registers a callback that runs after any write to the students table
+    made by this process, so its caches of roster data can be dropped
+    without waiting for the next version check.
+    """
+    _roster_listeners.append(callback)
+
+def notify_roster_change():
+    for callback in _roster_listeners:
+        callback()
+
+# attendance.date is written as YYYY-MM-DD by recognition and as DD-MM-YYYY
+# by manual marking and imports; normalize to ISO before comparing or grouping.
+def iso_date_sql(column="attendance.date"):
+    return (f"(CASE WHEN {column} LIKE '__-__-____' "
+            f"THEN substr({column}, 7, 4) || '-' || substr({column}, 4, 2) || '-' || substr({column}, 1, 2) "
+            f"ELSE {column} END)")
+
+def _parse_date(date_str):
+    for fmt in ("%Y-%m-%d", "%d-%m-%Y"):
+        try:
+            return datetime.strptime(date_str, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Invalid date '{date_str}', expected YYYY-MM-DD or DD-MM-YYYY.")
 
 # ----------------------------
 # 1. Connect & create tables
@@ -33,6 +96,32 @@ def init_db():
         UNIQUE(student_id, date)  -- prevents duplicate entries per student per day
     )
     """)
+
+    # Per-camera detection regions; polygons are JSON lists of normalized [x, y] points
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS camera_rois (
+        camera_id TEXT PRIMARY KEY,
+        polygons TEXT NOT NULL,
+        auto_learned INTEGER DEFAULT 0,
+        updated_at TEXT
+    )
+    """)
+
+    # Face boxes seen per camera (normalized), used to learn a camera's ROI
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS camera_face_boxes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        camera_id TEXT NOT NULL,
+        top REAL, right REAL, bottom REAL, left REAL,
+        seen_at TEXT
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_camera_face_boxes_camera ON camera_face_boxes (camera_id, id)")
+
+    create_roster_version(cursor)
+    create_attendance_summary(cursor)
+    create_recognition_review(cursor)
+    create_gallery_additions(cursor)
     conn.commit()
     conn.close()
 
@@ -48,88 +137,184 @@ def add_student(name, reg_no=None, class_name=None, section=None, photo_path=Non
     """, (name, reg_no, class_name, section, photo_path))
     conn.commit()
     conn.close()
+    notify_roster_change()
+
+# ----------------------------
+# 2b. Delete student
+# ----------------------------
+def delete_student(student_id):
+    conn = sqlite3.connect("attendance_demo.db")
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM attendance WHERE student_id = ?", (student_id,))
+    cursor.execute("DELETE FROM students WHERE id = ?", (student_id,))
+    conn.commit()
+    conn.close()
+    notify_roster_change()
 
 # ----------------------------
 # 3. Extract & register students from ZIP (with reg_no)
 # ----------------------------
 def register_students_from_zip(zip_file, extract_dir="demo_photos"):
-    if not os.path.exists(extract_dir):
-        os.makedirs(extract_dir)
-
-    with zipfile.ZipFile(zip_file, "r") as zip_ref:
-        zip_ref.extractall(extract_dir)
-
-    # assign reg_no starting from 101
-    reg_counter = 101
-    for file in sorted(os.listdir(extract_dir)):
-        if file.endswith(".png"):
-            # Format student name properly from filename
-            student_name = os.path.splitext(file)[0]
-            student_name = student_name.replace('-', ' ').title()
-            photo_path = os.path.join(extract_dir, file)
-            reg_no = str(reg_counter)
-            add_student(student_name, reg_no, None, None, photo_path)
-            reg_counter += 1
+    """
+    Registers a student per image in the archive without extracting it; see
+    enrolment.enrol_from_zip, which also encodes the faces.
+    """
+    import enrolment
+    return enrolment.enrol_from_zip(zip_file, extract_dir)
 
 
 # ----------------------------
 # 4. Import attendance (from Code1 CSV)
 # ----------------------------
-def import_attendance_from_csv(csv_file):
+# Accepted headers (case-insensitive): the legacy NAME/TIME files, the
+# per-day recognition CSVs and the /api/export-csv format
+IMPORT_COLUMNS = {
+    "name": ("name",),
+    "reg_no": ("roll number", "reg_no", "reg no", "roll"),
+    "date": ("date",),
+    "time": ("time",),
+    "status": ("status",),
+}
+FILENAME_DATE = re.compile(r"(\d{2}-\d{2}-\d{4}|\d{4}-\d{2}-\d{2})")
+
+def _import_column_map(fieldnames):
+    lowered = {name.strip().lower(): name for name in fieldnames or []}
+    return {key: next((lowered[alias] for alias in aliases if alias in lowered), None)
+            for key, aliases in IMPORT_COLUMNS.items()}
+
+def import_attendance_from_csv(csv_file, chunk_size=5000):
+    """
+    Bulk-imports attendance rows from a CSV file. Students are matched by
+    roll number when the file has one, else by name, against a map loaded
+    once up front. Each row's date comes from its Date column, or from a
+    date in the file name (e.g. Attendance_05-09-2025.csv). Rows are
+    inserted with executemany in one transaction per `chunk_size` rows, and
+    a student already marked that day (in either date format) is left alone.
+
+    Returns {"inserted", "duplicates", "unknown", "invalid"} row counts.
+    """
     conn = sqlite3.connect("attendance_demo.db")
     cursor = conn.cursor()
+    by_reg_no = {}
+    by_name = {}
+    for student_id, name, reg_no in cursor.execute("SELECT id, name, reg_no FROM students ORDER BY id"):
+        if reg_no:
+            by_reg_no[reg_no.strip()] = student_id
+        by_name.setdefault(name.strip().casefold(), student_id)
 
-    with open(csv_file, "r") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            name = row["NAME"]
-            time_str = row["TIME"]
-            date_str = datetime.now().strftime("%d-%m-%Y")
+    match = FILENAME_DATE.search(os.path.basename(csv_file))
+    file_date = _parse_date(match.group(1)) if match else None
+
+    query = """
+        INSERT OR IGNORE INTO attendance (student_id, date, time, status)
+        SELECT ?, ?, ?, ?
+        WHERE NOT EXISTS (SELECT 1 FROM attendance WHERE student_id = ? AND date = ?)
+    """
+    counts = {"inserted": 0, "duplicates": 0, "unknown": 0, "invalid": 0}
+
+    def flush(chunk):
+        # rowcount, unlike total_changes, leaves out the summary triggers' writes
+        with conn:
+            inserted = conn.executemany(query, chunk).rowcount
+        counts["inserted"] += inserted
+        counts["duplicates"] += len(chunk) - inserted
+
+    try:
+        with open(csv_file, "r", newline="") as f:
+            reader = csv.DictReader(f)
+            columns = _import_column_map(reader.fieldnames)
+            if not (columns["name"] or columns["reg_no"]):
+                raise ValueError(f"{csv_file} has neither a name nor a roll number column.")
+            if not (columns["date"] or file_date):
+                raise ValueError(f"{csv_file} has no Date column and no date in its file name.")
 
+            chunk = []
+            for row in reader:
+                student_id = None
+                if columns["reg_no"]:
+                    student_id = by_reg_no.get((row[columns["reg_no"]] or "").strip())
+                if student_id is None and columns["name"]:
+                    student_id = by_name.get((row[columns["name"]] or "").strip().casefold())
+                if student_id is None:
+                    counts["unknown"] += 1
+                    continue
 
-            cursor.execute("SELECT id FROM students WHERE name=?", (name,))
-            result = cursor.fetchone()
-            if result:
-                student_id = result[0]
+                status = (row[columns["status"]] or "").strip().title() if columns["status"] else "Present"
                 try:
-                    cursor.execute("""
-                        INSERT INTO attendance (student_id, date, time, status)
-                        VALUES (?, ?, ?, ?)
-                    """, (student_id, date_str, time_str, "Present"))
-                except sqlite3.IntegrityError:
-                    print(f"⚠️ {name} already marked present on {date_str}. Skipping...")
-    conn.commit()
-    conn.close()
+                    day = _parse_date(row[columns["date"]].strip()) if columns["date"] else file_date
+                except (AttributeError, ValueError):
+                    day = None
+                if day is None or status not in ("Present", "Absent"):
+                    counts["invalid"] += 1
+                    continue
+
+                time_str = (row[columns["time"]] or "").strip() if columns["time"] else ""
+                chunk.append((student_id, day.strftime("%d-%m-%Y"), time_str or "--:--:--", status,
+                              student_id, day.strftime("%Y-%m-%d")))
+                if len(chunk) >= chunk_size:
+                    flush(chunk)
+                    chunk = []
+            if chunk:
+                flush(chunk)
+    finally:
+        conn.close()
+
+    print(f"✅ Imported {csv_file}: {counts['inserted']} inserted, {counts['duplicates']} duplicates, "
+          f"{counts['unknown']} unknown students, {counts['invalid']} invalid rows")
+    return counts
 
 # ----------------------------
 # 5. Mark absentees
 # ----------------------------
-def mark_absentees(date_str=None):
-    if date_str is None:
-        date_str = datetime.now().strftime("%d-%m-%Y")
-
-    conn = sqlite3.connect("attendance_demo.db")
-    cursor = conn.cursor()
-
-    # Get all students
-    cursor.execute("SELECT id FROM students")
-    all_students = [row[0] for row in cursor.fetchall()]
-
-    # Get already marked students
-    cursor.execute("SELECT student_id FROM attendance WHERE date=?", (date_str,))
-    present_students = [row[0] for row in cursor.fetchall()]
+def mark_absentees(date_str=None, class_name=None, section=None, date_from=None, date_to=None):
+    """
+    Marks every student with no attendance row on a date as Absent, with one
+    INSERT ... SELECT per date. Pass date_str (stored as given, default today
+    as DD-MM-YYYY) or an inclusive date_from/date_to range to backfill many
+    dates (stored as DD-MM-YYYY) in one transaction. class_name and section
+    restrict which students are considered. A row in either date format
+    counts as already marked. Returns the number of absentees marked.
+    """
+    if date_from or date_to:
+        first = _parse_date(date_from or date_to)
+        last = _parse_date(date_to or date_from)
+        days = [first + timedelta(days=i) for i in range((last - first).days + 1)]
+        dates = [(day.strftime("%d-%m-%Y"), day) for day in days]
+    else:
+        if date_str is None:
+            date_str = datetime.now().strftime("%d-%m-%Y")
+        dates = [(date_str, _parse_date(date_str))]
 
-    absentees = set(all_students) - set(present_students)
+    query = """
+        INSERT OR IGNORE INTO attendance (student_id, date, time, status)
+        SELECT students.id, ?, '--:--:--', 'Absent'
+        FROM students
+        WHERE NOT EXISTS (
+            SELECT 1 FROM attendance
+            WHERE attendance.student_id = students.id AND attendance.date IN (?, ?)
+        )
+    """
+    scope = []
+    if class_name:
+        query += " AND students.class = ?"
+        scope.append(class_name)
+    if section:
+        query += " AND students.section = ?"
+        scope.append(section)
 
-    for student_id in absentees:
-        cursor.execute("""
-            INSERT OR IGNORE INTO attendance (student_id, date, time, status)
-            VALUES (?, ?, ?, 'Absent')
-        """, (student_id, date_str, "--:--:--"))
+    conn = sqlite3.connect("attendance_demo.db")
+    marked = 0
+    try:
+        with conn:
+            for stored, day in dates:
+                cursor = conn.execute(query, [stored, day.strftime("%Y-%m-%d"), day.strftime("%d-%m-%Y")] + scope)
+                marked += cursor.rowcount
+    finally:
+        conn.close()
 
-    conn.commit()
-    conn.close()
-    print(f"✅ Absentees marked for {date_str}")
+    label = dates[0][0] if len(dates) == 1 else f"{dates[0][0]} to {dates[-1][0]}"
+    print(f"✅ {marked} absentees marked for {label}")
+    return marked
 
 # ----------------------------
 # 6. View attendance (modified)
@@ -161,10 +346,535 @@ def view_attendance(date_str=None):
     return rows
 
 
+# ----------------------------
+# 7. Stream attendance rows
+# ----------------------------
+def iter_attendance(date_from=None, date_to=None, class_name=None, section=None, batch_size=1000):
+    """
+    Yields (reg_no, name, class, section, date, time, status) rows in date
+    order without loading the whole table. Dates are ISO (YYYY-MM-DD) and
+    the range bounds are inclusive.
+    """
+    iso_date = iso_date_sql()
+    query = f"""
+        SELECT students.reg_no, students.name, students.class, students.section,
+               {iso_date}, attendance.time, attendance.status
+        FROM attendance
+        JOIN students ON students.id = attendance.student_id
+    """
+    where_clauses = []
+    params = []
+
+    if date_from:
+        where_clauses.append(f"{iso_date} >= ?")
+        params.append(date_from)
+    if date_to:
+        where_clauses.append(f"{iso_date} <= ?")
+        params.append(date_to)
+    if class_name:
+        where_clauses.append("students.class = ?")
+        params.append(class_name)
+    if section:
+        where_clauses.append("students.section = ?")
+        params.append(section)
+
+    if where_clauses:
+        query += " WHERE " + " AND ".join(where_clauses)
+    query += f" ORDER BY {iso_date}, students.name"
+
+    conn = sqlite3.connect("attendance_demo.db")
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+
+# ----------------------------
+# 8. Camera regions of interest
+# ----------------------------
+def get_camera_roi(camera_id):
+    """
+    Returns (polygons, auto_learned) for a camera, or None if it has no ROI.
+    """
+    conn = sqlite3.connect("attendance_demo.db")
+    cursor = conn.cursor()
+    cursor.execute("SELECT polygons, auto_learned FROM camera_rois WHERE camera_id = ?", (camera_id,))
+    row = cursor.fetchone()
+    conn.close()
+    if row is None:
+        return None
+    return json.loads(row[0]), bool(row[1])
+
+def set_camera_roi(camera_id, polygons, auto_learned=False):
+    """
+    Stores a camera's ROI polygons; an empty list removes the ROI.
+    """
+    conn = sqlite3.connect("attendance_demo.db")
+    cursor = conn.cursor()
+    if polygons:
+        cursor.execute("""
+            INSERT OR REPLACE INTO camera_rois (camera_id, polygons, auto_learned, updated_at)
+            VALUES (?, ?, ?, ?)
+        """, (camera_id, json.dumps(polygons), int(auto_learned), datetime.now().isoformat(timespec="seconds")))
+    else:
+        cursor.execute("DELETE FROM camera_rois WHERE camera_id = ?", (camera_id,))
+    conn.commit()
+    conn.close()
+
+def record_face_boxes(camera_id, boxes, keep=5000):
+    """
+    Appends normalized (top, right, bottom, left) face boxes seen by a camera,
+    keeping only its `keep` most recent boxes.
+    """
+    if not boxes:
+        return
+    seen_at = datetime.now().isoformat(timespec="seconds")
+    conn = sqlite3.connect("attendance_demo.db")
+    cursor = conn.cursor()
+    cursor.executemany("""
+        INSERT INTO camera_face_boxes (camera_id, top, right, bottom, left, seen_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, [(camera_id, *box, seen_at) for box in boxes])
+    cursor.execute("""
+        DELETE FROM camera_face_boxes WHERE camera_id = ? AND id <= (
+            SELECT id FROM camera_face_boxes WHERE camera_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?
+        )
+    """, (camera_id, camera_id, keep))
+    conn.commit()
+    conn.close()
+
+def get_face_boxes(camera_id, limit=5000):
+    """
+    Returns the most recent normalized face boxes seen by a camera.
+    """
+    conn = sqlite3.connect("attendance_demo.db")
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT top, right, bottom, left FROM camera_face_boxes
+        WHERE camera_id = ? ORDER BY id DESC LIMIT ?
+    """, (camera_id, limit))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+
+# ----------------------------
+# 9. Daily attendance summaries
+# ----------------------------
+# One row per (ISO date, class, section) with present/absent/total counts.
+# Triggers on attendance keep it current for every writer (recognition,
+# manual marking, imports, absentee marking); a student without a class or
+# section is counted under ''. Counts are attributed to the student's class
+# at the time of the write, so call rebuild_attendance_summary() after
+# moving students between classes.
+def _summary_key_sql(row):
+    return (f"{iso_date_sql(row + '.date')}, "
+            f"COALESCE((SELECT class FROM students WHERE id = {row}.student_id), ''), "
+            f"COALESCE((SELECT section FROM students WHERE id = {row}.student_id), '')")
+
+def _summary_add_sql(row):
+    return f"""
+        INSERT INTO attendance_daily_summary (date, class, section, present, absent, total)
+        VALUES ({_summary_key_sql(row)}, {row}.status = 'Present', {row}.status = 'Absent', 1)
+        ON CONFLICT (date, class, section) DO UPDATE SET
+            present = present + excluded.present,
+            absent = absent + excluded.absent,
+            total = total + 1;
+    """
+
+def _summary_remove_sql(row):
+    return f"""
+        UPDATE attendance_daily_summary SET
+            present = present - ({row}.status = 'Present'),
+            absent = absent - ({row}.status = 'Absent'),
+            total = total - 1
+        WHERE (date, class, section) = ({_summary_key_sql(row)});
+    """
+
+def create_attendance_summary(cursor):
+    """
+    Creates the summary table and its triggers, filling the table from the
+    existing attendance rows the first time.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'attendance_daily_summary'")
+    exists = cursor.fetchone() is not None
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS attendance_daily_summary (
+        date TEXT NOT NULL,
+        class TEXT NOT NULL,
+        section TEXT NOT NULL,
+        present INTEGER NOT NULL DEFAULT 0,
+        absent INTEGER NOT NULL DEFAULT 0,
+        total INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (date, class, section)
+    )
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS attendance_summary_insert AFTER INSERT ON attendance
+    BEGIN {_summary_add_sql("NEW")} END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS attendance_summary_delete AFTER DELETE ON attendance
+    BEGIN {_summary_remove_sql("OLD")} END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS attendance_summary_update AFTER UPDATE OF student_id, date, status ON attendance
+    BEGIN {_summary_remove_sql("OLD")} {_summary_add_sql("NEW")} END
+    """)
+    if not exists:
+        _fill_attendance_summary(cursor)
+
+def _fill_attendance_summary(cursor):
+    iso_date = iso_date_sql()
+    cursor.execute(f"""
+        INSERT INTO attendance_daily_summary (date, class, section, present, absent, total)
+        SELECT {iso_date}, COALESCE(students.class, ''), COALESCE(students.section, ''),
+               SUM(attendance.status = 'Present'), SUM(attendance.status = 'Absent'), COUNT(*)
+        FROM attendance
+        LEFT JOIN students ON students.id = attendance.student_id
+        GROUP BY 1, 2, 3
+    """)
+
+def rebuild_attendance_summary():
+    """
+    Recomputes every summary row from the attendance table.
+    """
+    conn = sqlite3.connect("attendance_demo.db")
+    try:
+        with conn:
+            conn.execute("DELETE FROM attendance_daily_summary")
+            _fill_attendance_summary(conn.cursor())
+    finally:
+        conn.close()
+
+def _summary_filters(date_from, date_to, class_name, section):
+    where_clauses = ["total > 0"]
+    params = []
+    if date_from:
+        where_clauses.append("date >= ?")
+        params.append(date_from)
+    if date_to:
+        where_clauses.append("date <= ?")
+        params.append(date_to)
+    if class_name:
+        where_clauses.append("class = ?")
+        params.append(class_name)
+    if section:
+        where_clauses.append("section = ?")
+        params.append(section)
+    return " WHERE " + " AND ".join(where_clauses), params
+
+def get_attendance_summary(date_from=None, date_to=None, class_name=None, section=None):
+    """
+    Returns (date, class, section, present, absent, total) rows per day,
+    with ISO dates and inclusive range bounds.
+    """
+    where, params = _summary_filters(date_from, date_to, class_name, section)
+    conn = sqlite3.connect("attendance_demo.db")
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT date, class, section, present, absent, total
+            FROM attendance_daily_summary {where}
+            ORDER BY date, class, section
+        """, params)
+        return cursor.fetchall()
+    finally:
+        conn.close()
+
+def get_attendance_totals(date_from=None, date_to=None, class_name=None, section=None):
+    """
+    Returns (class, section, days, present, absent, total) rows summed over
+    the date range, e.g. for a term.
+    """
+    where, params = _summary_filters(date_from, date_to, class_name, section)
+    conn = sqlite3.connect("attendance_demo.db")
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT class, section, COUNT(*), SUM(present), SUM(absent), SUM(total)
+            FROM attendance_daily_summary {where}
+            GROUP BY class, section
+            ORDER BY class, section
+        """, params)
+        return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+# ----------------------------
+# 10. Match thresholds and review queue
+# ----------------------------
+# Thresholds override the server defaults per camera or per class; a NULL
+# column inherits. Matches below the auto-mark confidence are queued in
+# match_reviews, one pending row per student and day, for a teacher to
+# accept or reject.
+REVIEW_STATUSES = ('pending', 'accepted', 'rejected', 'superseded')
+
+def create_recognition_review(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS recognition_thresholds (
+        scope TEXT NOT NULL CHECK(scope IN ('camera','class')),
+        scope_key TEXT NOT NULL,
+        tolerance REAL,
+        min_confidence REAL,
+        updated_at TEXT,
+        PRIMARY KEY (scope, scope_key)
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS match_reviews (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL,
+        roll_number TEXT NOT NULL,
+        camera_id TEXT,
+        distance REAL,
+        confidence REAL,
+        margin REAL,
+        candidates TEXT NOT NULL,
+        sightings INTEGER NOT NULL DEFAULT 1,
+        status TEXT NOT NULL DEFAULT 'pending'
+            CHECK(status IN ('pending','accepted','rejected','superseded')),
+        created_at TEXT,
+        resolved_at TEXT,
+        resolved_roll_number TEXT
+    )
+    """)
+    cursor.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_match_reviews_pending
+    ON match_reviews (date, roll_number) WHERE status = 'pending'
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_match_reviews_status ON match_reviews (status, date)")
+
+def get_recognition_thresholds():
+    """
+    Returns {(scope, key): (tolerance, min_confidence)} for every override.
+    """
+    conn = sqlite3.connect("attendance_demo.db")
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT scope, scope_key, tolerance, min_confidence FROM recognition_thresholds")
+        return {(scope, key): (tolerance, min_confidence) for scope, key, tolerance, min_confidence in cursor}
+    finally:
+        conn.close()
+
+def set_recognition_thresholds(scope, key, tolerance=None, min_confidence=None):
+    """
+    Stores the overrides for a camera or class; with both None the override
+    is removed.
+    """
+    conn = sqlite3.connect("attendance_demo.db")
+    try:
+        with conn:
+            if tolerance is None and min_confidence is None:
+                conn.execute("DELETE FROM recognition_thresholds WHERE scope = ? AND scope_key = ?", (scope, key))
+            else:
+                conn.execute("""
+                    INSERT OR REPLACE INTO recognition_thresholds (scope, scope_key, tolerance, min_confidence, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (scope, key, tolerance, min_confidence, datetime.now().isoformat(timespec="seconds")))
+    finally:
+        conn.close()
+
+def queue_match_review(roll_number, distance, confidence, margin, candidates, camera_id=None):
+    """
+    Queues today's ambiguous match of a student for review, unless the
+    student is already present today. Repeated sightings while the review
+    is pending are counted, and the most confident one is kept. Returns
+    True if a review is pending for the student afterwards.
+    """
+    now = datetime.now()
+    iso_date = now.strftime("%Y-%m-%d")
+    conn = sqlite3.connect("attendance_demo.db")
+    try:
+        with conn:
+            cursor = conn.execute("""
+                INSERT INTO match_reviews (date, roll_number, camera_id, distance, confidence, margin, candidates, created_at)
+                SELECT ?, ?, ?, ?, ?, ?, ?, ?
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM attendance JOIN students ON students.id = attendance.student_id
+                    WHERE students.reg_no = ? AND attendance.date IN (?, ?) AND attendance.status = 'Present'
+                )
+                ON CONFLICT (date, roll_number) WHERE status = 'pending' DO UPDATE SET
+                    sightings = sightings + 1,
+                    camera_id = CASE WHEN excluded.confidence > confidence THEN excluded.camera_id ELSE camera_id END,
+                    distance = CASE WHEN excluded.confidence > confidence THEN excluded.distance ELSE distance END,
+                    margin = CASE WHEN excluded.confidence > confidence THEN excluded.margin ELSE margin END,
+                    candidates = CASE WHEN excluded.confidence > confidence THEN excluded.candidates ELSE candidates END,
+                    confidence = MAX(confidence, excluded.confidence)
+            """, (iso_date, roll_number, camera_id, distance, confidence, margin, json.dumps(candidates),
+                  now.isoformat(timespec="seconds"), roll_number, iso_date, now.strftime("%d-%m-%Y")))
+            return cursor.rowcount > 0
+    finally:
+        conn.close()
+
+def supersede_match_reviews(cursor, roll_number, iso_date):
+    """
+    Closes a student's pending review for a day once they are marked
+    present some other way. Runs in the caller's transaction.
+    """
+    cursor.execute("""
+        UPDATE match_reviews SET status = 'superseded', resolved_at = ?
+        WHERE date = ? AND roll_number = ? AND status = 'pending'
+    """, (datetime.now().isoformat(timespec="seconds"), iso_date, roll_number))
+
+def get_match_reviews(status="pending", date_from=None, date_to=None, class_name=None, section=None, limit=500):
+    """
+    Returns review rows as dicts, oldest first, with the student's stored
+    name, class and section.
+    """
+    where_clauses = ["match_reviews.status = ?"]
+    params = [status]
+    if date_from:
+        where_clauses.append("match_reviews.date >= ?")
+        params.append(date_from)
+    if date_to:
+        where_clauses.append("match_reviews.date <= ?")
+        params.append(date_to)
+    if class_name:
+        where_clauses.append("students.class = ?")
+        params.append(class_name)
+    if section:
+        where_clauses.append("students.section = ?")
+        params.append(section)
+    conn = sqlite3.connect("attendance_demo.db")
+    conn.row_factory = sqlite3.Row
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT match_reviews.*, students.name, students.class, students.section
+            FROM match_reviews
+            LEFT JOIN students ON students.reg_no = match_reviews.roll_number
+            WHERE {" AND ".join(where_clauses)}
+            ORDER BY match_reviews.date, match_reviews.id
+            LIMIT ?
+        """, params + [limit])
+        rows = [dict(row) for row in cursor]
+    finally:
+        conn.close()
+    for row in rows:
+        row["candidates"] = json.loads(row["candidates"])
+    return rows
+
+def resolve_match_review(review_id, accept, roll_number=None):
+    """
+    Accepts or rejects a pending review. Accepting marks the student (or
+    `roll_number`, when the teacher picked another of the review's
+    candidates) present on the review's date. Returns the resolved roll
+    number (None on reject). Raises LookupError if the review is not
+    pending or the student does not exist, and ValueError if `roll_number`
+    is not one of the candidates.
+    """
+    conn = sqlite3.connect("attendance_demo.db")
+    try:
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT date, roll_number, created_at, candidates FROM match_reviews
+                WHERE id = ? AND status = 'pending'
+            """, (review_id,))
+            row = cursor.fetchone()
+            if row is None:
+                raise LookupError(f"No pending review {review_id}")
+            iso_date, matched_roll, created_at, candidates = row
+            candidate_rolls = [matched_roll] + [candidate["rollNumber"] for candidate in json.loads(candidates)]
+            if accept and roll_number and roll_number not in candidate_rolls:
+                raise ValueError(f"Roll number {roll_number} is not a candidate of review {review_id}")
+            resolved_roll = (roll_number or matched_roll) if accept else None
+            if accept:
+                cursor.execute("SELECT id FROM students WHERE reg_no = ?", (resolved_roll,))
+                student = cursor.fetchone()
+                if student is None:
+                    raise LookupError(f"No student with roll number {resolved_roll}")
+                # Same storage format as recognition (ISO date), and the time the face was seen
+                cursor.execute("""
+                    INSERT INTO attendance (student_id, date, time, status)
+                    VALUES (?, ?, ?, 'Present')
+                    ON CONFLICT (student_id, date) DO UPDATE SET status = 'Present'
+                """, (student[0], iso_date, created_at[11:19]))
+            cursor.execute("""
+                UPDATE match_reviews SET status = ?, resolved_at = ?, resolved_roll_number = ?
+                WHERE id = ?
+            """, ("accepted" if accept else "rejected", datetime.now().isoformat(timespec="seconds"),
+                  resolved_roll, review_id))
+            if accept and resolved_roll != matched_roll:
+                supersede_match_reviews(cursor, resolved_roll, iso_date)
+        return resolved_roll
+    finally:
+        conn.close()
+
+
+# ----------------------------
+# 11. Gallery additions
+# ----------------------------
+# Encodings of students enrolled while the server runs. Every process that
+# serves recognition appends the rows it has not seen yet to its in-memory
+# gallery, so an enrolment handled by one worker (or by the api profile,
+# which has no gallery) reaches all of them without re-encoding photos.
+# The highest id is the gallery version.
+def create_gallery_additions(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS gallery_additions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        roll_number TEXT NOT NULL,
+        name TEXT NOT NULL,
+        encoding BLOB NOT NULL,
+        added_at TEXT
+    )
+    """)
+
+def record_gallery_additions(encodings, names, roll_numbers):
+    """
+    Stores newly enrolled encodings (float64 rows) for every server process
+    to pick up.
+    """
+    added_at = datetime.now().isoformat(timespec="seconds")
+    conn = sqlite3.connect("attendance_demo.db")
+    try:
+        with conn:
+            conn.executemany("""
+                INSERT INTO gallery_additions (roll_number, name, encoding, added_at)
+                VALUES (?, ?, ?, ?)
+            """, [(roll_number, name, bytes(memoryview(encoding.astype("<f8"))), added_at)
+                  for encoding, name, roll_number in zip(encodings, names, roll_numbers)])
+    finally:
+        conn.close()
+
+def get_gallery_version():
+    conn = sqlite3.connect("attendance_demo.db")
+    try:
+        return conn.execute("SELECT COALESCE(MAX(id), 0) FROM gallery_additions").fetchone()[0]
+    finally:
+        conn.close()
+
+def get_gallery_additions(after_version=0):
+    """
+    Returns (version, [encoding bytes], names, roll numbers) for the rows
+    added after `after_version`.
+    """
+    conn = sqlite3.connect("attendance_demo.db")
+    try:
+        rows = conn.execute("""
+            SELECT id, encoding, name, roll_number FROM gallery_additions
+            WHERE id > ? ORDER BY id
+        """, (after_version,)).fetchall()
+    finally:
+        conn.close()
+    if not rows:
+        return after_version, [], [], []
+    return rows[-1][0], [row[1] for row in rows], [row[2] for row in rows], [row[3] for row in rows]
+
+
 # ----------------------------
 # Demo
 # ----------------------------
 if __name__ == "__main__":
     # Initialize database and register students
     init_db()
-    register_students_from_zip("final_images.zip")
\ No newline at end of file
+    register_students_from_zip("final_images.zip")
@@ -1,12 +1,25 @@
 import os
+import io
+import time
+import hmac
 import base64
-import numpy as np
-import cv2
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, json, stream_with_context
 from flask_cors import CORS
-import face_recognition
-from deepface import DeepFace
 import DataBase_attendance as db
+import camera_roi
+import enrolment
+import metrics
+import profiler
+from gallery import FaceGallery, match_confidence
+from motion_gate import MotionGate, frame_fingerprint
+from recognition_pool import PoolSaturated, RecognitionPool
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from search_cache import StudentSearchCache
+from roster_cache import RosterResponseCache, body_etag
+from compression import ResponseCompressor
+from csv_writer import DailyAttendanceCsvWriter
+from metrics import StageTimer
+from collections import Counter
 from datetime import datetime
 import csv
 
@@ -15,66 +28,122 @@ app = Flask(__name__)
 # Configure CORS to allow requests from the frontend
 CORS(app, resources={r"/api/*": {
     "origins": ["http://localhost:8080", "http://localhost:5000", "http://127.0.0.1:5000", "http://localhost:8081"],
-    "methods": ["GET", "POST", "OPTIONS"],
+    "methods": ["GET", "POST", "PUT", "OPTIONS"],
     "allow_headers": ["Content-Type", "Origin", "Accept"],
     "supports_credentials": True
-}})# Directory to store known faces
-KNOWN_FACES_DIR = "/Users/utkarshsinha/Documents/Final Model/Backend/known_faces"
+}})
+# Compress JSON responses above COMPRESSION_MIN_SIZE bytes (see benchmarks/bench_compression.py)
+COMPRESSION_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+ResponseCompressor(app, COMPRESSION_MIN_SIZE, GZIP_LEVEL, BROTLI_QUALITY)
 
-# Global variables for known faces and encodings
-known_face_encodings = []
-known_face_names = []
-known_face_roll_numbers = []
+# Directory to store known faces
+KNOWN_FACES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'known_faces')
+
+# CPU-heavy recognition runs in a bounded process pool; the HTTP thread only
+# matches encodings and writes attendance. 0 workers analyzes frames inline.
+RECOGNITION_POOL_WORKERS = int(os.environ.get("RECOGNITION_POOL_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+RECOGNITION_QUEUE_SIZE = int(os.environ.get("RECOGNITION_QUEUE_SIZE", 8))
+RECOGNITION_TIMEOUT = 30
+recognition_pool = RecognitionPool(RECOGNITION_POOL_WORKERS, RECOGNITION_QUEUE_SIZE)
+
+# Per-camera ROI polygons, cached briefly since they change rarely
+CAMERA_ROI_TTL = 60
+ROI_LEARN_MIN_BOXES = 50
+# Every Nth request from a camera with an ROI scans the whole frame, so faces
+# outside the ROI are still recorded and relearning can widen it again
+ROI_FULL_FRAME_EVERY = 50
+camera_rois = {}
+camera_roi_requests = Counter()
+
+def get_camera_polygons(camera_id):
+    """
+    Returns the ROI polygons for a camera, or None to scan the whole frame.
+    """
+    if not camera_id:
+        return None
+    cached = camera_rois.get(camera_id)
+    now = time.monotonic()
+    if cached is None or now - cached[0] >= CAMERA_ROI_TTL:
+        stored = db.get_camera_roi(camera_id)
+        cached = (now, stored[0] if stored else None)
+        camera_rois[camera_id] = cached
+    polygons = cached[1]
+    if polygons:
+        camera_roi_requests[camera_id] += 1
+        if camera_roi_requests[camera_id] % ROI_FULL_FRAME_EVERY == 0:
+            return None
+    return polygons
+
+def record_camera_faces(camera_id, analyses):
+    """
+    Keeps the face boxes a camera saw so its ROI can be learned later.
+    """
+    if not camera_id:
+        return
+    boxes = []
+    for analysis in analyses:
+        if analysis["faces"]:
+            height, width = analysis["size"]
+            boxes += camera_roi.normalize_boxes([face["box"] for face in analysis["faces"]], width, height)
+    try:
+        db.record_face_boxes(camera_id, boxes)
+    except Exception as e:
+        print(f"Error recording face boxes for camera {camera_id}: {e}")
+
+# Frames from a camera that match its last analyzed frame reuse that result
+MOTION_PIXEL_DELTA = 20
+MOTION_CHANGED_FRACTION = 0.005
+MOTION_MAX_AGE = 30
+motion_gate = MotionGate(MOTION_PIXEL_DELTA, MOTION_CHANGED_FRACTION, MOTION_MAX_AGE)
+
+# Known faces are encoded by create_app (or on first use), never at import time,
+# in GALLERY_ENCODE_WORKERS spawned processes so dlib stays out of this one.
+# GALLERY_PRECISION is float32 (default), float64, int8 or pq; the compressed
+# ones re-rank their GALLERY_RERANK closest candidates exactly.
+GALLERY_PRECISION = os.environ.get("GALLERY_PRECISION", "float32")
+GALLERY_RERANK = int(os.environ.get("GALLERY_RERANK", 32))
+GALLERY_ENCODE_WORKERS = int(os.environ.get("GALLERY_ENCODE_WORKERS", os.cpu_count() or 1))
+gallery = FaceGallery(KNOWN_FACES_DIR, GALLERY_PRECISION, GALLERY_RERANK, GALLERY_ENCODE_WORKERS)
+# Students enrolled through any worker reach this one's gallery within this many seconds
+GALLERY_SYNC_INTERVAL = 5
+
+# A face matches the closest student within MATCH_TOLERANCE. Attendance is
+# marked automatically only when the match confidence (see
+# gallery.match_confidence) reaches AUTO_MARK_CONFIDENCE; weaker matches
+# are queued for teacher review. Both can be overridden per camera or class.
+MATCH_TOLERANCE = float(os.environ.get("MATCH_TOLERANCE", 0.5))
+AUTO_MARK_CONFIDENCE = float(os.environ.get("AUTO_MARK_CONFIDENCE", 0.1))
+MATCH_TOP_K = int(os.environ.get("MATCH_TOP_K", 3))
+THRESHOLDS_TTL = 60
+recognition_thresholds = {}
+match_decisions = Counter()
+
+def get_thresholds(camera_id=None, class_name=None):
+    """
+    Returns (tolerance, min_confidence) for a frame: the camera's override,
+    else its class's, else the defaults, field by field.
+    """
+    cached = recognition_thresholds.get("all")
+    now = time.monotonic()
+    if cached is None or now - cached[0] >= THRESHOLDS_TTL:
+        cached = (now, db.get_recognition_thresholds())
+        recognition_thresholds["all"] = cached
+    overrides = cached[1]
+    camera = overrides.get(("camera", camera_id), (None, None)) if camera_id else (None, None)
+    klass = overrides.get(("class", class_name), (None, None)) if class_name else (None, None)
+    tolerance = next((value for value in (camera[0], klass[0]) if value is not None), MATCH_TOLERANCE)
+    min_confidence = next((value for value in (camera[1], klass[1]) if value is not None), AUTO_MARK_CONFIDENCE)
+    return tolerance, min_confidence
 
 def load_known_faces():
     """
     Loads images from the known_faces directory and generates face encodings.
     """
-    global known_face_encodings, known_face_names, known_face_roll_numbers
-    
-    print("Loading known faces...")
-    known_face_encodings = []
-    known_face_names = []
-    known_face_roll_numbers = []
-
-    for name_folder in os.listdir(KNOWN_FACES_DIR):
-        if name_folder.startswith('.'):
-            continue
-        
-        name, roll_number = name_folder.rsplit('_', 1)
-        person_dir = os.path.join(KNOWN_FACES_DIR, name_folder)
-        
-        # Get actual student name from database
-        conn = db.sqlite3.connect("attendance_demo.db")
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM students WHERE reg_no = ?", (roll_number,))
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            db_name = result[0]
-            if db_name == roll_number:
-                actual_name = name.replace('-', ' ').title()
-            else:
-                actual_name = db_name
-        else:
-            actual_name = name.replace('-', ' ').title()
-        
-        if os.path.isdir(person_dir):
-            for filename in os.listdir(person_dir):
-                if filename.startswith('.'):
-                    continue
-                
-                if filename.endswith(('.jpg', '.jpeg', '.png')):
-                    image_path = os.path.join(person_dir, filename)
-                    image = face_recognition.load_image_file(image_path)
-                    encodings = face_recognition.face_encodings(image)
-                    
-                    if encodings:
-                        known_face_encodings.append(encodings[0])
-                        known_face_names.append(actual_name)
-                        known_face_roll_numbers.append(roll_number)
-                        print(f"Loaded encoding for {actual_name} ({roll_number}) from {filename}")
+    snapshot = gallery.load()
+    motion_gate.forget()
+    return snapshot
 
 def update_known_faces():
     """
@@ -82,47 +151,61 @@ def update_known_faces():
     """
     load_known_faces()
 
-# Initial load of known faces
-load_known_faces()
+def create_app(preload_gallery=False, warm_up_models=False, serve_recognition=True):
+    """
+    Runs the application start-up lifecycle and returns the Flask app.
 
-@app.route('/api/save-attendance-csv', methods=['POST'])
-def save_attendance_to_csv(student_name, roll_number, date_str, time_str):
+    warm_up_models starts the recognition pool, whose workers load and warm
+    the models; pre-fork masters must leave it off and start the pool in
+    each worker instead. With preload_gallery the gallery is encoded before returning, which is
+    what a pre-fork server master wants so workers inherit it copy-on-write.
+    Otherwise it is loaded on a background thread and /api/health reports
+    when it is ready. Processes that only serve roster and attendance
+    endpoints pass serve_recognition=False to skip the gallery entirely.
     """
-    Saves attendance data to a CSV file.
+    db.init_db()
+    app.config['SERVE_RECOGNITION'] = serve_recognition
+    if serve_recognition:
+        if preload_gallery:
+            gallery.load()
+        else:
+            gallery.start_loading()
+    if warm_up_models:
+        recognition_pool.start()
+    return app
+
+# Typeahead cache for /api/students/search, dropped whenever the roster version moves
+SEARCH_CACHE_SIZE = 256
+SEARCH_CACHE_TTL = 60
+student_search_cache = StudentSearchCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL, db.get_roster_version)
+db.on_roster_change(student_search_cache.invalidate)
+
+# Serialized /api/students bodies per (class, section), rebuilt when the roster version moves
+ROSTER_CACHE_TTL = 300
+roster_response_cache = RosterResponseCache(db.get_roster_version, ROSTER_CACHE_TTL)
+
+def conditional_json(body, etag):
     """
-    import csv
-    import os
-    
-    try:
-        # Create attendance directory if it doesn't exist
-        attendance_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'attendance_records')
-        print(f"Creating attendance directory at: {attendance_dir}")
-        if not os.path.exists(attendance_dir):
-            os.makedirs(attendance_dir)
-            print(f"Created attendance directory")
-        
-        # CSV file path with date in filename
-        csv_file = os.path.join(attendance_dir, f'attendance_{date_str}.csv')
-        file_exists = os.path.exists(csv_file)
-        print(f"CSV file path: {csv_file}, exists: {file_exists}")
-    
-        # Write to CSV file
-        with open(csv_file, mode='a', newline='') as file:
-            writer = csv.writer(file)
-            if not file_exists:
-                writer.writerow(['Name', 'Roll Number', 'Date', 'Time', 'Status'])
-            writer.writerow([student_name, roll_number, date_str, time_str, 'Present'])
-            print(f"Successfully wrote attendance for {student_name} to CSV")
-        return True
-    except Exception as e:
-        print(f"Error saving attendance to CSV: {str(e)}")
-        raise
+    Wraps pre-serialized JSON in a response carrying an ETag, answering
+    If-None-Match with 304 Not Modified.
+    """
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+# Per-recognition CSV rows are queued in memory and flushed by a background thread
+ATTENDANCE_RECORDS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'attendance_records')
+CSV_FLUSH_INTERVAL = 1.0
+CSV_FSYNC_INTERVAL = 5.0
+attendance_csv_writer = DailyAttendanceCsvWriter(ATTENDANCE_RECORDS_DIR, CSV_FLUSH_INTERVAL, CSV_FSYNC_INTERVAL)
 
-def save_attendance_to_db(roll_number):
+def save_attendance_to_db(roll_number, timer=None):
     """
     Saves attendance to the database using the student's roll number.
-    This function will be called directly from recognize_face.
+    This function will be called directly from recognize_face. With a
+    StageTimer the CSV append is timed as the "csv" stage.
     """
+    timer = timer or StageTimer()
     # Connect to the database
     conn = db.sqlite3.connect("attendance_demo.db")
     cursor = conn.cursor()
@@ -148,9 +231,11 @@ def save_attendance_to_db(roll_number):
                     INSERT INTO attendance (student_id, date, time, status)
                     VALUES (?, ?, ?, 'Present')
                 """, (student_id, date_str, time_str))
+                db.supersede_match_reviews(cursor, roll_number, date_str)
                 conn.commit()
                 # Save to CSV as well
-                save_attendance_to_csv(student_name, roll_number, date_str, time_str)
+                with timer.stage("csv"):
+                    attendance_csv_writer.append(student_name, roll_number, date_str, time_str)
                 print(f"Attendance marked for {student_name} ({roll_number})")
                 return True
             else:
@@ -168,94 +253,530 @@ def save_attendance_to_db(roll_number):
         conn.close()
 
 
+def gallery_not_ready():
+    """
+    Returns the 503 sent while the gallery is still loading, or None once it
+    is ready. A ready gallery picks up recent enrolments in the background.
+    """
+    if gallery.ready.is_set():
+        gallery.sync_in_background(GALLERY_SYNC_INTERVAL)
+        return None
+    gallery.start_loading()
+    response = jsonify({"success": False, "message": "Face gallery is still loading, try again shortly."})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+def pool_saturated(e):
+    response = jsonify({"success": False, "message": "Recognition is busy, try again shortly."})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 429
+
+def identify_faces(analyses, timer=None, camera_id=None, class_name=None):
+    """
+    Matches every face of every analyzed frame against the gallery in one
+    matrix operation. Each face gets its MATCH_TOP_K closest students with
+    distances, the margin to the runner-up and a confidence score. Confident
+    matches mark attendance once per student; weaker ones within tolerance
+    are queued for review ("decision" is "auto", "review" or "unknown").
+    Returns the detectedFaces list for each frame. With a StageTimer the
+    matching is timed as "match" and attendance writes as "db" (which
+    includes the nested "csv" append).
+    """
+    timer = timer or StageTimer()
+    tolerance, min_confidence = get_thresholds(camera_id, class_name)
+    known_faces = gallery.snapshot()
+    faces = [face for analysis in analyses for face in analysis["faces"]]
+    with timer.stage("match"):
+        # Two candidates at least, so every match has a runner-up to compare with
+        top_students = known_faces.top_students([face["encoding"] for face in faces], max(2, MATCH_TOP_K))
+
+    marked = set()
+    reviewed = set()
+    results = []
+    position = 0
+    for analysis in analyses:
+        recognized_faces = []
+        for face in analysis["faces"]:
+            name = "Unknown"
+            roll_number = "N/A"
+            decision = "unknown"
+
+            candidates = top_students[position]
+            position += 1
+            distances = [distance for _index, distance in candidates]
+            confidence = match_confidence(distances, tolerance)
+            if distances and distances[0] <= tolerance:
+                name = known_faces.names[candidates[0][0]]
+                roll_number = known_faces.roll_numbers[candidates[0][0]]
+                decision = "auto" if confidence >= min_confidence else "review"
+            match_decisions[decision] += 1
+
+            listed = [{
+                "name": known_faces.names[index],
+                "rollNumber": known_faces.roll_numbers[index],
+                "distance": round(distance, 4),
+            } for index, distance in candidates[:MATCH_TOP_K]]
+            margin = round(distances[1] - distances[0], 4) if len(distances) > 1 else None
+
+            # Marking a student present closes any review queued for them today
+            if decision == "auto" and roll_number not in marked:
+                marked.add(roll_number)
+                with timer.stage("db"):
+                    save_attendance_to_db(roll_number, timer)
+            elif decision == "review" and roll_number not in marked | reviewed:
+                reviewed.add(roll_number)
+                with timer.stage("db"):
+                    try:
+                        db.queue_match_review(roll_number, distances[0], confidence, margin, listed, camera_id)
+                    except Exception as e:
+                        print(f"Error queueing review for {roll_number}: {e}")
+
+            # Spoofing detection is a placeholder; a dedicated liveness model is
+            # needed in production. For now we assume no spoofing.
+            spoofed = False
+
+            recognized_faces.append({
+                "name": name,
+                "rollNumber": roll_number,
+                "spoofed": spoofed,
+                "emotion": face["emotion"],
+                "decision": decision,
+                "distance": round(distances[0], 4) if distances else None,
+                "margin": margin,
+                "confidence": round(confidence, 4),
+                "candidates": listed,
+            })
+        results.append(recognized_faces)
+    return results
+
+def wants_timings(data=None):
+    """
+    Per-stage timings are returned when asked for with ?timings=1 or a
+    truthy "timings" field in the JSON body.
+    """
+    if request.args.get('timings', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return bool(data and data.get('timings'))
+
+def finish_timings(timer, frame_timings=(), start=None):
+    """
+    Folds the worker-side timings of each analyzed frame into the request's
+    timer, records everything in the stage histograms and returns the
+    timings block for the response.
+    """
+    for timings in frame_timings:
+        timer.merge(timings)
+    if start is not None:
+        timer.add("total", (time.perf_counter() - start) * 1000)
+    metrics.observe_stages(timer.timings)
+    return timer.rounded()
+
 @app.route('/api/recognize', methods=['POST'])
 def recognize_face():
     """
     Receives an image via POST request, performs face recognition, and returns results.
     """
+    start = time.perf_counter()
+    timer = StageTimer()
     data = request.get_json()
     img_data = data.get('image', None)
+    camera_id = data.get('cameraId')
+    class_name = data.get('className')
 
     if not img_data:
         return jsonify({"success": False, "message": "No image data provided."}), 400
     
+    not_ready = gallery_not_ready()
+    if not_ready:
+        return not_ready
+    
     # FIX: The frontend now sends the raw base64 string without the header.
     # The split(',') is no longer needed to remove the header.
     try:
-        img_bytes = base64.b64decode(img_data)
-        np_arr = np.frombuffer(img_bytes, np.uint8)
-        img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-
+        with timer.stage("b64"):
+            img_bytes = base64.b64decode(img_data)
     except Exception as e:
         return jsonify({"success": False, "message": f"Invalid image data: {str(e)}"}), 400
 
-    if img is None:
-        return jsonify({"success": False, "message": "Could not decode image."}), 400
+    # A static classroom produces near-identical frames; reuse the last result
+    with timer.stage("fingerprint"):
+        fingerprint = frame_fingerprint(img_bytes) if camera_id else None
+        unchanged = motion_gate.check(camera_id, fingerprint)
+    if unchanged is not None:
+        response = {"success": True, "detectedFaces": unchanged, "unchanged": True}
+        timings = finish_timings(timer, start=start)
+        if wants_timings(data):
+            response["timings"] = timings
+        return jsonify(response)
+
+    # Detection, encoding and emotion analysis run in the recognition pool;
+    # "pool" is the whole round trip, the worker reports its own stages
+    try:
+        with timer.stage("pool"):
+            future = recognition_pool.submit(img_bytes, get_camera_polygons(camera_id))
+            analysis = future.result(timeout=RECOGNITION_TIMEOUT)
+    except PoolSaturated as e:
+        return pool_saturated(e)
+    except FutureTimeoutError:
+        return jsonify({"success": False, "message": "Recognition timed out."}), 504
+
+    if analysis["error"]:
+        return jsonify({"success": False, "message": analysis["error"]}), 400
 
-    rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    record_camera_faces(camera_id, [analysis])
+    recognized_faces = identify_faces([analysis], timer, camera_id, class_name)[0]
+    motion_gate.remember(camera_id, fingerprint, recognized_faces)
     
-    face_locations = face_recognition.face_locations(rgb_img)
-    face_encodings = face_recognition.face_encodings(rgb_img, face_locations)
+    if not recognized_faces:
+        response = {"success": True, "message": "No faces detected.", "detectedFaces": []}
+    else:
+        response = {"success": True, "detectedFaces": recognized_faces}
+    timings = finish_timings(timer, [analysis["timings"]], start)
+    if wants_timings(data):
+        response["timings"] = timings
+    return jsonify(response)
+
+@app.route('/api/recognize/batch', methods=['POST'])
+def recognize_faces_batch():
+    """
+    Recognizes a burst of frames from one camera. Frames are sent either as
+    multipart files named 'frames' (plus optional 'cameraId' and 'className'
+    fields) or as JSON {"images": [base64, ...], "cameraId": ..., "className": ...}.
+    Every student is marked once per batch however many frames they are in.
+    Worker stage timings in the optional timings block are summed over frames.
+    """
+    start = time.perf_counter()
+    timer = StageTimer()
+    data = None
+    if request.files:
+        frames = [file.read() for file in request.files.getlist('frames')]
+        camera_id = request.form.get('cameraId')
+        class_name = request.form.get('className')
+    else:
+        data = request.get_json(silent=True) or {}
+        camera_id = data.get('cameraId')
+        class_name = data.get('className')
+        try:
+            with timer.stage("b64"):
+                frames = [base64.b64decode(img_data) for img_data in data.get('images', [])]
+        except Exception as e:
+            return jsonify({"success": False, "message": f"Invalid image data: {str(e)}"}), 400
 
-    recognized_faces = []
+    if not frames:
+        return jsonify({"success": False, "message": "No frames provided."}), 400
+    if len(frames) > recognition_pool.capacity:
+        return jsonify({
+            "success": False,
+            "message": f"Too many frames, send at most {recognition_pool.capacity} per batch."
+        }), 413
 
-    for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-        name = "Unknown"
-        roll_number = "N/A"
-        
-        if known_face_encodings:
-            matches = face_recognition.compare_faces(known_face_encodings, face_encoding, tolerance=0.5)
-            
-            if True in matches:
-                first_match_index = matches.index(True)
-                name = known_face_names[first_match_index]
-                roll_number = known_face_roll_numbers[first_match_index]
+    not_ready = gallery_not_ready()
+    if not_ready:
+        return not_ready
 
-                save_attendance_to_db(roll_number)
-                
-        # Spoofing and Emotion Detection (requires a face)
-        spoofed = False
-        emotion = "Neutral"
+    analyses = []
+    with timer.stage("pool"):
+        try:
+            chunks = recognition_pool.submit_batch(frames, get_camera_polygons(camera_id))
+        except PoolSaturated as e:
+            return pool_saturated(e)
 
         try:
-            face_img = img[top:bottom, left:right]
-            if face_img.size > 0:
-                # Spoofing detection with DeepFace (can be resource intensive)
-                # You might need a more dedicated model for this in production.
-                # This is a placeholder for a more robust method.
-                # A simple check for a live face might be needed here.
-                # For this example, we assume no spoofing.
-                
-                # Emotion analysis
-                # DeepFace requires a path or a numpy array
-                demography = DeepFace.analyze(face_img, actions=['emotion'], enforce_detection=False)
-                if demography and 'emotion' in demography[0]:
-                    emotion = max(demography[0]['emotion'], key=demography[0]['emotion'].get)
-            
-        except Exception as e:
-            print(f"DeepFace analysis failed: {e}")
-            
-        recognized_faces.append({
-            "name": name,
-            "rollNumber": roll_number,
-            "spoofed": spoofed,
-            "emotion": emotion,
-        })
-    
-    if not recognized_faces:
-        return jsonify({"success": True, "message": "No faces detected.", "detectedFaces": []})
+            for _start, future in chunks:
+                analyses.extend(future.result(timeout=RECOGNITION_TIMEOUT))
+        except FutureTimeoutError:
+            return jsonify({"success": False, "message": "Recognition timed out."}), 504
 
-    return jsonify({"success": True, "detectedFaces": recognized_faces})
+    decoded = [analysis for analysis in analyses if not analysis["error"]]
+    record_camera_faces(camera_id, decoded)
+    detected = identify_faces(decoded, timer, camera_id, class_name)
+    frame_results = []
+    identities = {}
+    for analysis in analyses:
+        if analysis["error"]:
+            frame_results.append({"success": False, "message": analysis["error"], "detectedFaces": []})
+            continue
+        faces = detected.pop(0)
+        frame_results.append({"success": True, "detectedFaces": faces})
+        for face in faces:
+            if face["rollNumber"] != "N/A":
+                identity = identities.setdefault(face["rollNumber"], {
+                    "name": face["name"], "rollNumber": face["rollNumber"], "decision": face["decision"]})
+                if face["decision"] == "auto":
+                    identity["decision"] = "auto"
+
+    response = {
+        "success": True,
+        "frames": frame_results,
+        "recognized": list(identities.values()),
+    }
+    timings = finish_timings(timer, [analysis["timings"] for analysis in analyses], start)
+    if wants_timings(data):
+        response["timings"] = timings
+    return jsonify(response)
+
+@app.route('/api/cameras/<camera_id>/roi', methods=['GET'])
+def get_roi(camera_id):
+    """
+    Returns the detection regions configured for a camera.
+    """
+    stored = db.get_camera_roi(camera_id)
+    polygons, auto_learned = stored if stored else ([], False)
+    return jsonify({"success": True, "cameraId": camera_id, "polygons": polygons, "autoLearned": auto_learned})
+
+@app.route('/api/cameras/<camera_id>/roi', methods=['PUT'])
+def set_roi(camera_id):
+    """
+    Sets a camera's ROI as {"polygons": [[[x, y], ...], ...]} with points
+    normalized to the frame; an empty list scans the whole frame again.
+    """
+    data = request.get_json(silent=True) or {}
+    polygons = data.get('polygons', [])
+    try:
+        camera_roi.validate_polygons(polygons)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    db.set_camera_roi(camera_id, polygons)
+    camera_rois.pop(camera_id, None)
+    motion_gate.forget(camera_id)
+    return jsonify({"success": True, "cameraId": camera_id, "polygons": polygons, "autoLearned": False})
+
+@app.route('/api/cameras/<camera_id>/roi/learn', methods=['POST'])
+def learn_roi(camera_id):
+    """
+    Learns a camera's ROI from the face boxes it has seen so far. Optional
+    JSON: {"margin": 0.1, "coverage": 0.98}, with margin in [0, 1] and
+    coverage in (0, 1]. With an ROI set, only every ROI_FULL_FRAME_EVERY-th
+    frame records boxes outside it, so widening the ROI takes a while.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        margin = float(data.get('margin', 0.1))
+        coverage = float(data.get('coverage', 0.98))
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "message": "margin and coverage must be numbers."}), 400
+    if not 0 <= margin <= 1:
+        return jsonify({"success": False, "message": "margin must be in [0, 1]."}), 400
+    if not 0 < coverage <= 1:
+        return jsonify({"success": False, "message": "coverage must be in (0, 1]."}), 400
+
+    boxes = db.get_face_boxes(camera_id)
+    if len(boxes) < ROI_LEARN_MIN_BOXES:
+        return jsonify({
+            "success": False,
+            "message": f"Need at least {ROI_LEARN_MIN_BOXES} face boxes from this camera, have {len(boxes)}."
+        }), 409
+
+    polygons = camera_roi.learn_roi(boxes, margin, coverage)
+    db.set_camera_roi(camera_id, polygons, auto_learned=True)
+    camera_rois.pop(camera_id, None)
+    motion_gate.forget(camera_id)
+    return jsonify({"success": True, "cameraId": camera_id, "polygons": polygons,
+                    "autoLearned": True, "samples": len(boxes)})
+
+def parse_thresholds(data):
+    """
+    Reads {"tolerance": ..., "minConfidence": ...} from a request body;
+    null or missing fields inherit. Raises ValueError when out of range.
+    """
+    tolerance = data.get('tolerance')
+    min_confidence = data.get('minConfidence')
+    if tolerance is not None:
+        tolerance = float(tolerance)
+        if not 0 < tolerance <= 1:
+            raise ValueError("tolerance must be in (0, 1]")
+    if min_confidence is not None:
+        min_confidence = float(min_confidence)
+        if not 0 <= min_confidence <= 1:
+            raise ValueError("minConfidence must be in [0, 1]")
+    return tolerance, min_confidence
+
+@app.route('/api/recognition/thresholds', methods=['GET'])
+def list_thresholds():
+    """
+    Returns the default match thresholds and every camera and class override.
+    """
+    overrides = {"camera": {}, "class": {}}
+    for (scope, key), (tolerance, min_confidence) in sorted(db.get_recognition_thresholds().items()):
+        overrides[scope][key] = {"tolerance": tolerance, "minConfidence": min_confidence}
+    return jsonify({
+        "success": True,
+        "defaults": {"tolerance": MATCH_TOLERANCE, "minConfidence": AUTO_MARK_CONFIDENCE, "topK": MATCH_TOP_K},
+        "cameras": overrides["camera"],
+        "classes": overrides["class"],
+    })
+
+@app.route('/api/cameras/<camera_id>/thresholds', methods=['PUT'])
+@app.route('/api/classes/<class_name>/thresholds', methods=['PUT'])
+def set_thresholds(camera_id=None, class_name=None):
+    """
+    Overrides the match tolerance and auto-mark confidence for a camera or
+    a class as {"tolerance": 0.45, "minConfidence": 0.2}. A camera's
+    override wins over its class's; sending both as null removes it.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        tolerance, min_confidence = parse_thresholds(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    scope, key = ("camera", camera_id) if camera_id is not None else ("class", class_name)
+    db.set_recognition_thresholds(scope, key, tolerance, min_confidence)
+    recognition_thresholds.clear()
+    if camera_id is not None:
+        motion_gate.forget(camera_id)
+    else:
+        motion_gate.forget()
+    return jsonify({"success": True, "scope": scope, "key": key,
+                    "tolerance": tolerance, "minConfidence": min_confidence})
+
+@app.route('/api/reviews', methods=['GET'])
+def list_reviews():
+    """
+    Lists queued match reviews. Query parameters: status (pending by
+    default), from/to (ISO dates), class, section.
+    """
+    status = request.args.get('status', 'pending')
+    if status not in db.REVIEW_STATUSES:
+        return jsonify({"success": False, "message": f"status must be one of {', '.join(db.REVIEW_STATUSES)}"}), 400
+    date_from = request.args.get('from')
+    date_to = request.args.get('to')
+    invalid = invalid_date_range(date_from, date_to)
+    if invalid:
+        return invalid
+
+    reviews = db.get_match_reviews(status, date_from, date_to, request.args.get('class'), request.args.get('section'))
+    return jsonify({"success": True, "data": [{
+        "id": review["id"],
+        "date": review["date"],
+        "rollNumber": review["roll_number"],
+        "name": review["name"],
+        "class": review["class"],
+        "section": review["section"],
+        "cameraId": review["camera_id"],
+        "distance": review["distance"],
+        "margin": review["margin"],
+        "confidence": review["confidence"],
+        "candidates": review["candidates"],
+        "sightings": review["sightings"],
+        "status": review["status"],
+        "createdAt": review["created_at"],
+        "resolvedAt": review["resolved_at"],
+        "resolvedRollNumber": review["resolved_roll_number"],
+    } for review in reviews]})
+
+@app.route('/api/reviews/<int:review_id>', methods=['POST'])
+def resolve_review(review_id):
+    """
+    Resolves a pending review with {"action": "accept" | "reject"}. On
+    accept, an optional "rollNumber" marks one of the review's other
+    candidates present instead of the closest match; any other roll
+    number is rejected with 400.
+    """
+    data = request.get_json(silent=True) or {}
+    action = data.get('action')
+    if action not in ('accept', 'reject'):
+        return jsonify({"success": False, "message": "action must be 'accept' or 'reject'."}), 400
+
+    try:
+        roll_number = db.resolve_match_review(review_id, action == 'accept', data.get('rollNumber'))
+    except LookupError as e:
+        return jsonify({"success": False, "message": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    return jsonify({"success": True, "id": review_id, "status": f"{action}ed", "rollNumber": roll_number})
+
+@app.route('/api/health', methods=['GET'])
+def health():
+    """
+    Readiness probe: 200 once the models are warm and the gallery is loaded,
+    503 before, so load balancers only route camera traffic to warm workers.
+    """
+    models = recognition_pool.status()
+    known_faces = gallery.status()
+    ready = models["state"] == "ready" and known_faces["state"] == "ready"
+    if not app.config.get('SERVE_RECOGNITION', True):
+        ready = True
+    return jsonify({
+        "status": "ready" if ready else "starting",
+        "models": models,
+        "gallery": known_faces,
+    }), 200 if ready else 503
+
+@app.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Per-stage recognition latency histograms and pool/gate counters in the
+    Prometheus text format. Each gunicorn worker keeps its own numbers.
+    """
+    pool = recognition_pool.status()
+    body = metrics.render(
+        gauges=[
+            ("recognition_pool_in_flight", "Frames admitted to the recognition pool.", pool["inFlight"]),
+            ("recognition_pool_capacity", "Frames the recognition pool admits at once.", pool["capacity"]),
+            ("gallery_faces", "Encodings in the loaded face gallery.", len(gallery.snapshot())),
+        ],
+        counters=[
+            ("recognition_pool_rejected_total", "Frames rejected with 429.", pool["rejected"]),
+            ("motion_gate_skipped_total", "Frames answered from the motion gate.", motion_gate.skipped),
+            ("motion_gate_processed_total", "Frames the motion gate sent to recognition.", motion_gate.processed),
+            ("recognition_faces_auto_total", "Faces matched confidently enough to mark attendance.",
+             match_decisions["auto"]),
+            ("recognition_faces_review_total", "Faces matched within tolerance but queued for review.",
+             match_decisions["review"]),
+            ("recognition_faces_unknown_total", "Faces with no student within tolerance.", match_decisions["unknown"]),
+        ])
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+# The profiler endpoint is disabled unless an admin token is configured
+PROFILER_TOKEN = os.environ.get("PROFILER_TOKEN")
+
+@app.route('/api/admin/profile', methods=['POST'])
+def profile_recognition():
+    """
+    Samples the recognition path of this worker and its pool processes for
+    ?seconds=N (default 10, max 60) every ?interval_ms=M (default 5) and
+    returns collapsed stacks for flamegraph tools. Needs the X-Admin-Token
+    header to match PROFILER_TOKEN.
+    """
+    if not PROFILER_TOKEN:
+        return jsonify({"success": False, "message": "Profiling is disabled."}), 404
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), PROFILER_TOKEN):
+        return jsonify({"success": False, "message": "Admin token required."}), 403
+    try:
+        seconds = min(float(request.args.get('seconds', 10)), profiler.MAX_SECONDS)
+        interval = float(request.args.get('interval_ms', 5)) / 1000
+    except ValueError:
+        return jsonify({"success": False, "message": "seconds and interval_ms must be numbers."}), 400
+
+    sampler = profiler.StackSampler(profiler.HTTP_SCOPE, interval, label=f"http-{os.getpid()}")
+    try:
+        profiles = recognition_pool.profile(seconds, interval, sampler.run)
+    except RuntimeError as e:
+        return jsonify({"success": False, "message": str(e)}), 409
+    stacks = sum(profiles, Counter())
+    return Response(profiler.collapsed(stacks), mimetype='text/plain')
 
 # Student API endpoints
-@app.route('/api/students', methods=['GET'])
-def get_students():
+def serialize_students(rows):
     """
-    Get all students with optional filtering by class and section
+    Converts (id, name, reg_no, class, section, photo_path) rows to JSON bytes.
+    """
+    students = [{
+        "id": str(row[0]),
+        "name": row[1],
+        "rollNumber": row[2],
+        "class": row[3],
+        "section": row[4],
+        "photoPath": row[5]
+    } for row in rows]
+    return json.dumps(students).encode('utf-8')
+
+def query_roster(class_filter, section_filter):
+    """
+    Fetches the students matching the optional class and section filters.
     """
-    class_filter = request.args.get('class')
-    section_filter = request.args.get('section')
-    
     conn = db.sqlite3.connect("attendance_demo.db")
     cursor = conn.cursor()
     
@@ -277,25 +798,29 @@ def get_students():
             params.append(section_filter)
     
     cursor.execute(query, params)
-    students = [{
-        "id": str(row[0]),
-        "name": row[1],
-        "rollNumber": row[2],
-        "class": row[3],
-        "section": row[4],
-        "photoPath": row[5]
-    } for row in cursor.fetchall()]
+    rows = cursor.fetchall()
     
     conn.close()
-    return jsonify(students)
+    return rows
 
-@app.route('/api/students/search', methods=['GET'])
-def search_students():
+@app.route('/api/students', methods=['GET'])
+def get_students():
     """
-    Search students by name or roll number
+    Get all students with optional filtering by class and section
     """
-    query = request.args.get('q', '')
+    class_filter = request.args.get('class')
+    section_filter = request.args.get('section')
     
+    body, etag = roster_response_cache.get(
+        (class_filter, section_filter),
+        lambda: serialize_students(query_roster(class_filter, section_filter))
+    )
+    return conditional_json(body, etag)
+
+def query_students(query):
+    """
+    Runs the LIKE search behind /api/students/search and returns raw rows.
+    """
     conn = db.sqlite3.connect("attendance_demo.db")
     cursor = conn.cursor()
     
@@ -304,18 +829,50 @@ def search_students():
         FROM students 
         WHERE name LIKE ? OR reg_no LIKE ?
     """, (f'%{query}%', f'%{query}%'))
-    
-    students = [{
-        "id": str(row[0]),
-        "name": row[1],
-        "rollNumber": row[2],
-        "class": row[3],
-        "section": row[4],
-        "photoPath": row[5]
-    } for row in cursor.fetchall()]
+    rows = cursor.fetchall()
     
     conn.close()
-    return jsonify(students)
+    return rows
+
+# Processes that encode the faces of an uploaded enrolment archive
+ENROLMENT_WORKERS = int(os.environ.get("ENROLMENT_WORKERS", os.cpu_count() or 1))
+
+@app.route('/api/students/enrol', methods=['POST'])
+def enrol_students():
+    """
+    Enrols one student per photo of an uploaded ZIP ('archive' file, with
+    optional 'class' and 'section' fields). Photos are saved under
+    known_faces and their encodings are stored as gallery additions: this
+    worker's gallery takes them at once, every other recognition worker
+    within GALLERY_SYNC_INTERVAL seconds. Files whose roll number belongs
+    to another student are listed under "conflicts" and not enrolled.
+    """
+    archive = request.files.get('archive')
+    if archive is None:
+        return jsonify({"success": False, "message": "No archive provided."}), 400
+
+    serves_gallery = app.config.get('SERVE_RECOGNITION', True)
+    try:
+        report = enrolment.enrol_from_zip(archive.stream, KNOWN_FACES_DIR, gallery if serves_gallery else None,
+                                          request.form.get('class'), request.form.get('section'),
+                                          ENROLMENT_WORKERS)
+    except enrolment.zipfile.BadZipFile:
+        return jsonify({"success": False, "message": "The archive is not a valid ZIP file."}), 400
+
+    motion_gate.forget()
+    if not gallery.ready.is_set() and serves_gallery:
+        gallery.start_loading()
+    return jsonify({"success": True, **report})
+
+@app.route('/api/students/search', methods=['GET'])
+def search_students():
+    """
+    Search students by name or roll number
+    """
+    query = request.args.get('q', '')
+    
+    body = serialize_students(student_search_cache.get(query, query_students))
+    return conditional_json(body, body_etag(body))
 
 # Attendance API endpoints
 @app.route('/api/attendance', methods=['POST'])
@@ -335,9 +892,11 @@ def mark_attendance():
     for student_id in student_ids:
         try:
             time_str = datetime.now().strftime("%H:%M:%S")
+            # An upsert rather than INSERT OR REPLACE, so the summary triggers see the change
             cursor.execute("""
-                INSERT OR REPLACE INTO attendance (student_id, date, time, status)
+                INSERT INTO attendance (student_id, date, time, status)
                 VALUES (?, ?, ?, 'Present')
+                ON CONFLICT (student_id, date) DO UPDATE SET time = excluded.time, status = 'Present'
             """, (student_id, date_str, time_str))
             success_count += 1
         except Exception as e:
@@ -410,69 +969,110 @@ def get_attendance():
         "data": attendance_records
     })
 
-def save_attendance_to_csv():
+EXPORT_CSV_HEADER = ['Roll Number', 'Name', 'Class', 'Section', 'Date', 'Time', 'Status']
+EXPORT_CHUNK_ROWS = 1000
+
+def stream_attendance_csv(date_from=None, date_to=None, class_filter=None, section_filter=None):
     """
-    Exports all attendance data from the SQLite database to a specific CSV file.
-    The filename will be 'Attendance_DD-MM-YYYY.csv' in the specified directory.
+    Yields the attendance export as CSV text, one chunk per EXPORT_CHUNK_ROWS rows.
     """
-    # Define the base directory and the specific filename
-    base_dir = "/Users/utkarshsinha/Downloads/Final Model/Backend/Attendance/Attendance_10-09-2025.csv"
-    date_str = datetime.now().strftime("%d-%m-%Y")
-    filename = f"Attendance_{date_str}.csv"
-    full_path = os.path.join(base_dir, filename)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_CSV_HEADER)
 
-    # Ensure the directory exists
-    if not os.path.exists(base_dir):
-        os.makedirs(base_dir)
-        print(f"Created directory: {base_dir}")
+    rows = db.iter_attendance(date_from, date_to, class_filter, section_filter, EXPORT_CHUNK_ROWS)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
 
-    conn = db.sqlite3.connect("attendance_demo.db")
-    cursor = conn.cursor()
+    yield buffer.getvalue()
 
-    try:
-        # Get all attendance records along with student details
-        cursor.execute("""
-            SELECT students.reg_no, students.name, attendance.date, attendance.time, attendance.status
-            FROM attendance
-            JOIN students ON students.id = attendance.student_id
-            ORDER BY attendance.date, students.name
-        """)
-        
-        # Fetch all records
-        records = cursor.fetchall()
-        
-        if not records:
-            print("No attendance data to save to CSV.")
-            return
+def invalid_date_range(date_from, date_to):
+    """
+    Returns a 400 response if either bound is not YYYY-MM-DD, else None.
+    """
+    for value in (date_from, date_to):
+        if value:
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                return jsonify({"success": False, "message": f"Invalid date '{value}', expected YYYY-MM-DD."}), 400
+    return None
 
-        # Define the header for the CSV file
-        header = ['Roll Number', 'Name', 'Date', 'Time', 'Status']
-        
-        with open(full_path, 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(header)  # Write the header
-            writer.writerows(records) # Write the data rows
-            
-        print(f"Attendance data successfully saved to {full_path}")
+@app.route('/api/attendance/summary', methods=['GET'])
+def get_attendance_summary():
+    """
+    Present/absent/total counts per day, class and section from the
+    precomputed summary table, optionally filtered by from/to
+    (YYYY-MM-DD, inclusive), class and section.
+    """
+    date_from = request.args.get('from')
+    date_to = request.args.get('to')
+    invalid = invalid_date_range(date_from, date_to)
+    if invalid:
+        return invalid
 
-    except Exception as e:
-        print(f"Error saving data to CSV: {e}")
-    finally:
-        conn.close()
+    rows = db.get_attendance_summary(date_from, date_to, request.args.get('class'), request.args.get('section'))
+    return jsonify({"success": True, "data": [{
+        "date": row[0],
+        "class": row[1] or None,
+        "section": row[2] or None,
+        "present": row[3],
+        "absent": row[4],
+        "total": row[5],
+    } for row in rows]})
+
+@app.route('/api/attendance/summary/totals', methods=['GET'])
+def get_attendance_totals():
+    """
+    Counts per class and section summed over from/to, e.g. for a term
+    dashboard, with the attendance rate of each.
+    """
+    date_from = request.args.get('from')
+    date_to = request.args.get('to')
+    invalid = invalid_date_range(date_from, date_to)
+    if invalid:
+        return invalid
+
+    rows = db.get_attendance_totals(date_from, date_to, request.args.get('class'), request.args.get('section'))
+    return jsonify({"success": True, "data": [{
+        "class": row[0] or None,
+        "section": row[1] or None,
+        "days": row[2],
+        "present": row[3],
+        "absent": row[4],
+        "total": row[5],
+        "rate": round(row[3] / row[5], 4) if row[5] else None,
+    } for row in rows]})
 
 @app.route('/api/export-csv', methods=['GET'])
 def export_csv():
     """
-    API endpoint to trigger the CSV export.
+    Streams attendance as a CSV download, optionally filtered by
+    from/to (YYYY-MM-DD, inclusive), class and section.
     """
-    save_attendance_to_csv()
-    
-    # You might want to return the file for download here
-    # For now, let's just confirm the action
-    return jsonify({"success": True, "message": "CSV export initiated."})
+    date_from = request.args.get('from')
+    date_to = request.args.get('to')
+    class_filter = request.args.get('class')
+    section_filter = request.args.get('section')
+
+    invalid = invalid_date_range(date_from, date_to)
+    if invalid:
+        return invalid
+
+    filename = f"Attendance_{date_from or 'start'}_{date_to or datetime.now().strftime('%Y-%m-%d')}.csv"
+    return Response(
+        stream_with_context(stream_attendance_csv(date_from, date_to, class_filter, section_filter)),
+        mimetype='text/csv',
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 if __name__ == '__main__':
-    # Initialize the database
-    db.init_db()
+    # Initialize the database, then load the gallery and warm the models in the background
+    create_app(warm_up_models=True)
     
-    # You can change host and port as needed for deployment
+    # Development server only; see DEPLOYMENT.md for the gunicorn profile
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,416 @@
+"""
+Offline benchmark suite for the backend. Runs against a generated database
+and synthetic galleries of random 128-d encodings, and measures gallery
+build, matching, full recognition on generated frames with several faces,
+roster queries, attendance writes and exports. Results are JSON and are
+compared against a stored baseline.
+
+    python benchmarks/bench_backend.py [--galleries 1000,10000,100000] [--faces 1,10,50]
+        [--students 2000] [--days 30] [--repeat 5] [--json] [--output results.json]
+        [--baseline benchmarks/baseline.json] [--save-baseline] [--tolerance 0.25]
+
+The exit status is 1 when a benchmark is slower than its baseline by more
+than `--tolerance` (and by more than `--min-delta-ms`). Timings depend on the
+machine, so the baseline is not checked in: record one with --save-baseline
+on the machine that runs the comparison. A baseline recorded on another host
+or with other workload arguments is not compared against.
+"""
+import argparse
+import contextlib
+import importlib.util
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import app as backend
+import columnar_export
+import DataBase_attendance as db
+import ml_models
+from gallery import PRECISIONS, GallerySnapshot, build_snapshot, encode_known_faces
+from recognition_pool import analyze_frame
+
+# Arguments that don't change what is timed
+COMPARISON_ARGS = ("tolerance", "min_delta_ms")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+FIRST_NAMES = ["Avijit", "Saanjh", "Soumya", "Sreyan", "Subham", "Utkarsh", "Asray", "Priya", "Rahul", "Anita"]
+LAST_NAMES = ["Chowdhury", "Nayak", "Panda", "Sarangi", "Sinha", "Kumar", "Sharma", "Das", "Mishra", "Patel"]
+# Real face_recognition encodings have a norm close to 1
+ENCODING_SCALE = 1 / math.sqrt(128)
+
+
+def timed(fn, repeat, setup=None):
+    """
+    Runs fn `repeat` times (after an untimed setup each time) and returns
+    median/min wall time in milliseconds.
+    """
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": round(statistics.median(runs), 3), "min_ms": round(min(runs), 3), "runs": repeat}
+
+
+def synthetic_rows(rng, count):
+    return list(rng.normal(0.0, ENCODING_SCALE, size=(count, 128)))
+
+
+def synthetic_snapshot(rows):
+    return GallerySnapshot(np.vstack(rows), [f"Student {i}" for i in range(len(rows))],
+                           [str(100000 + i) for i in range(len(rows))])
+
+
+def synthetic_queries(rng, snapshot, count):
+    """
+    Half the queries are noisy copies of gallery rows (matches), half are
+    unrelated encodings (unknown faces).
+    """
+    picks = snapshot.encodings[rng.integers(0, len(snapshot), size=(count + 1) // 2)]
+    matches = picks + rng.normal(0.0, 0.02 * ENCODING_SCALE, size=picks.shape)
+    unknown = rng.normal(0.0, ENCODING_SCALE, size=(count // 2, 128))
+    return np.vstack([matches, unknown])
+
+
+def bench_galleries(results, rng, sizes, face_counts, repeat):
+    for size in sizes:
+        rows = synthetic_rows(rng, size)
+        snapshot = synthetic_snapshot(rows)
+        results[f"gallery_build/size={size}"] = dict(
+            timed(lambda: synthetic_snapshot(rows), repeat), bytes=snapshot.nbytes())
+        for faces in face_counts:
+            queries = synthetic_queries(rng, snapshot, faces)
+            # The same top-k search identify_faces runs for every frame
+            results[f"match/size={size}/faces={faces}"] = timed(
+                lambda: snapshot.top_students(queries, max(2, backend.MATCH_TOP_K)), repeat)
+
+
+def hard_queries(rng, matrix, count, low=0.3, high=0.7):
+    """
+    Queries at a distance spread around the 0.5 tolerance from a random
+    gallery row, where quantization error can flip a match decision.
+    """
+    directions = rng.normal(size=(count, matrix.shape[1]))
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    return matrix[rng.integers(0, len(matrix), size=count)] + directions * rng.uniform(low, high, size=(count, 1))
+
+
+def bench_precisions(results, rng, sizes, repeat, queries=200, tolerance=0.5):
+    """
+    Memory and accuracy of each gallery precision against exact float64
+    matching: top-1 agreement and match/no-match decision agreement.
+    """
+    for size in sizes:
+        matrix = np.vstack(synthetic_rows(rng, size))
+        labels = [str(i) for i in range(size)]
+        probe = hard_queries(rng, matrix, queries)
+        reference_index, reference_distance = build_snapshot(matrix, labels, labels, "float64").nearest(probe)
+        reference = np.where(reference_distance[:, 0] <= tolerance, reference_index[:, 0], -1)
+        faces = probe[:10]
+        for precision in PRECISIONS:
+            start = time.perf_counter()
+            snapshot = build_snapshot(matrix, labels, labels, precision)
+            build_ms = (time.perf_counter() - start) * 1000
+            index, distance = snapshot.nearest(probe)
+            decision = np.where(distance[:, 0] <= tolerance, index[:, 0], -1)
+            results[f"precision/size={size}/{precision}"] = dict(
+                timed(lambda: snapshot.nearest(faces), repeat),
+                build_ms=round(build_ms, 1),
+                bytes=snapshot.nbytes(),
+                bytes_per_face=round(snapshot.nbytes() / size, 1),
+                top1_agreement=round(float(np.mean(index[:, 0] == reference_index[:, 0])), 4),
+                decision_agreement=round(float(np.mean(decision == reference)), 4),
+            )
+
+
+def make_frames(known_faces_dir, face_counts, tile=256):
+    """
+    Tiles the known_faces photos into one JPEG per face count, so each frame
+    holds that many (repeated) faces.
+    """
+    cv2 = ml_models.get_cv2()
+    photos = []
+    for name_folder in sorted(os.listdir(known_faces_dir)):
+        person_dir = os.path.join(known_faces_dir, name_folder)
+        if name_folder.startswith('.') or not os.path.isdir(person_dir):
+            continue
+        for filename in sorted(os.listdir(person_dir)):
+            if not filename.endswith(('.jpg', '.jpeg', '.png')):
+                continue
+            img = cv2.imread(os.path.join(person_dir, filename))
+            if img is not None:
+                scale = tile / max(img.shape[:2])
+                photos.append(cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA))
+
+    frames = {}
+    for faces in face_counts:
+        cols = math.ceil(math.sqrt(faces))
+        canvas = np.zeros((math.ceil(faces / cols) * tile, cols * tile, 3), np.uint8)
+        for i in range(faces):
+            photo = photos[i % len(photos)]
+            top, left = (i // cols) * tile, (i % cols) * tile
+            canvas[top:top + photo.shape[0], left:left + photo.shape[1]] = photo
+        frames[faces] = cv2.imencode('.jpg', canvas)[1].tobytes()
+    return frames
+
+
+def bench_recognition(results, rng, gallery_size, face_counts, repeat, known_faces_dir):
+    missing = [name for name in ("face_recognition", "deepface") if importlib.util.find_spec(name) is None]
+    if missing:
+        for faces in face_counts:
+            results[f"recognize/faces={faces}"] = {"skipped": f"{', '.join(missing)} not installed"}
+        return
+
+    # The real known faces plus random filler up to the gallery size
+    known = encode_known_faces(known_faces_dir)
+    rows = list(known.encodings) + synthetic_rows(rng, max(0, gallery_size - len(known)))
+    backend.gallery.replace(GallerySnapshot(np.vstack(rows), known.names + [""] * (len(rows) - len(known)),
+                                            known.roll_numbers + ["N/A"] * (len(rows) - len(known))))
+    for faces, frame in make_frames(known_faces_dir, face_counts).items():
+        analysis = analyze_frame(frame)
+        results[f"recognize/faces={faces}"] = dict(
+            timed(lambda: backend.identify_faces([analyze_frame(frame)]), repeat),
+            detected=len(analysis["faces"]))
+
+
+def populate_db(rng, students, days):
+    """
+    Fills the (temporary) database with `students` and `days` of attendance
+    at a 90% attendance rate. Returns the roll numbers and the last date.
+    """
+    db.init_db()
+    roll_numbers = [str(20240000 + i) for i in range(students)]
+    conn = db.sqlite3.connect("attendance_demo.db")
+    conn.executemany(
+        "INSERT INTO students (name, reg_no, class, section, photo_path) VALUES (?, ?, ?, ?, ?)",
+        [(f"{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)}", roll, random.choice(["IX", "X", "XI", "XII"]),
+          random.choice("ABCD"), f"/known_faces/student_{roll}/") for roll in roll_numbers])
+    first_day = date(2025, 9, 1)
+    rows = []
+    for day in range(days):
+        date_str = (first_day + timedelta(days=day)).isoformat()
+        for student_id in range(1, students + 1):
+            present = rng.random() < 0.9
+            rows.append((student_id, date_str, "09:00:00" if present else "--:--:--",
+                         "Present" if present else "Absent"))
+    conn.executemany("INSERT INTO attendance (student_id, date, time, status) VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+    db.notify_roster_change()
+    return roll_numbers, (first_day + timedelta(days=days - 1)).isoformat()
+
+
+def clear_today():
+    conn = db.sqlite3.connect("attendance_demo.db")
+    conn.execute("DELETE FROM attendance WHERE date = ?", (datetime.now().strftime("%Y-%m-%d"),))
+    conn.commit()
+    conn.close()
+
+
+def bench_database(results, rng, students, days, writes, repeat, workdir):
+    roll_numbers, last_day = populate_db(rng, students, days)
+    client = backend.app.test_client()
+
+    results["roster/all"] = timed(lambda: backend.query_roster(None, None), repeat)
+    results["roster/class_section"] = timed(lambda: backend.query_roster("X", "A"), repeat)
+    results["roster/search"] = timed(lambda: backend.query_students("sa"), repeat)
+    results["roster/http_cold"] = timed(lambda: client.get("/api/students"), repeat,
+                                        setup=backend.roster_response_cache.invalidate)
+    results["attendance/http_day"] = timed(lambda: client.get(f"/api/attendance?date={last_day}"), repeat)
+
+    def write_attendance():
+        for roll_number in roll_numbers[:writes]:
+            backend.save_attendance_to_db(roll_number)
+    write = timed(write_attendance, repeat, setup=clear_today)
+    results["attendance/write"] = dict(write, writes=writes, per_write_ms=round(write["median_ms"] / writes, 3))
+    backend.attendance_csv_writer.flush()
+
+    results["export/csv"] = dict(timed(lambda: sum(map(len, backend.stream_attendance_csv())), repeat),
+                                 rows=students * days)
+    if columnar_export.pa is None:
+        results["export/parquet"] = {"skipped": "pyarrow not installed"}
+    else:
+        out = os.path.join(workdir, "parquet")
+        results["export/parquet"] = dict(
+            timed(lambda: columnar_export.export_attendance_parquet(out), repeat,
+                  setup=lambda: shutil.rmtree(out, ignore_errors=True)),
+            rows=students * days)
+        check_parquet_unassigned(workdir)
+
+
+def check_parquet_unassigned(workdir):
+    """
+    Adds a month in which no student has a class or section (students
+    enrolled without one) and checks that it exports and loads alongside
+    the generated months, with and without class partitions.
+    """
+    conn = db.sqlite3.connect("attendance_demo.db")
+    with conn:
+        rows = conn.execute("SELECT COUNT(*) FROM attendance").fetchone()[0] + 1
+        student_id = conn.execute("INSERT INTO students (name, reg_no) VALUES ('Unassigned Student', '19990001')").lastrowid
+        conn.execute("INSERT INTO attendance (student_id, date, time, status) VALUES (?, '2025-08-29', '09:00:00', 'Present')",
+                     (student_id,))
+    conn.close()
+
+    for partition_by_class in (False, True):
+        out = os.path.join(workdir, "parquet-unassigned")
+        shutil.rmtree(out, ignore_errors=True)
+        columnar_export.export_attendance_parquet(out, partition_by_class=partition_by_class)
+        table = columnar_export.load_attendance_parquet(out)
+        if table.num_rows != rows:
+            raise RuntimeError(f"Parquet export round trip: {table.num_rows} of {rows} rows loaded "
+                               f"(partition_by_class={partition_by_class})")
+
+
+def baseline_mismatches(meta, baseline_meta):
+    """
+    Lists the host properties and workload arguments that differ between
+    this run and the baseline, as "name: baseline -> this run" strings.
+    """
+    mismatches = []
+    for key in ("host", "platform", "cpus", "python", "numpy"):
+        if baseline_meta.get(key) != meta[key]:
+            mismatches.append(f"{key}: {baseline_meta.get(key)} -> {meta[key]}")
+    baseline_args = baseline_meta.get("args", {})
+    for key, value in meta["args"].items():
+        if key not in COMPARISON_ARGS and baseline_args.get(key) != value:
+            mismatches.append(f"--{key.replace('_', '-')}: {baseline_args.get(key)} -> {value}")
+    return mismatches
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """
+    Returns one row per benchmark present (and timed) in both runs.
+    """
+    rows = []
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name, {})
+        if "median_ms" not in result or not base.get("median_ms"):
+            continue
+        ratio = result["median_ms"] / base["median_ms"]
+        rows.append({
+            "name": name,
+            "baseline_ms": base["median_ms"],
+            "median_ms": result["median_ms"],
+            "ratio": round(ratio, 2),
+            "regression": ratio > 1 + tolerance and result["median_ms"] - base["median_ms"] > min_delta_ms,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--galleries", default="1000,10000,100000", help="synthetic gallery sizes")
+    parser.add_argument("--faces", default="1,10,50", help="faces per query frame")
+    parser.add_argument("--recognition-gallery", type=int, default=1000)
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--writes", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--known-faces", default=os.path.join(BACKEND_DIR, "known_faces"))
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before flagging")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="ignore slowdowns smaller than this")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    rng = np.random.default_rng(args.seed)
+    sizes = [int(size) for size in args.galleries.split(",")]
+    face_counts = [int(faces) for faces in args.faces.split(",")]
+    known_faces_dir = os.path.abspath(args.known_faces)
+
+    # Everything that touches the database or the CSV records runs in a scratch directory
+    workdir = tempfile.mkdtemp(prefix="smart-attend-bench-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    backend.attendance_csv_writer.directory = os.path.join(workdir, "attendance_records")
+    results = {}
+    try:
+        # The attendance code logs every write; keep that out of the report
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            bench_galleries(results, rng, sizes, face_counts, args.repeat)
+            bench_precisions(results, rng, sizes, args.repeat)
+            bench_database(results, rng, args.students, args.days, args.writes, args.repeat, workdir)
+            bench_recognition(results, rng, args.recognition_gallery, face_counts, args.repeat, known_faces_dir)
+    finally:
+        backend.attendance_csv_writer.close()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "host": platform.node(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items()
+                     if key not in ("baseline", "save_baseline", "output", "json", "known_faces")},
+        },
+        "results": results,
+    }
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        mismatches = baseline_mismatches(report["meta"], baseline.get("meta", {}))
+        if mismatches:
+            report["baseline_mismatches"] = mismatches
+        else:
+            report["comparison"] = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    comparison = {row["name"]: row for row in report.get("comparison", [])}
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'benchmark':<32}{'median ms':>12}{'min ms':>10}{'baseline':>10}{'ratio':>8}")
+        for name, result in results.items():
+            if "skipped" in result:
+                print(f"{name:<32}  skipped: {result['skipped']}")
+                continue
+            row = comparison.get(name)
+            base = f"{row['baseline_ms']:>10}{row['ratio']:>8}" if row else ""
+            flag = "  REGRESSION" if row and row["regression"] else ""
+            extra = (f"  {result['bytes'] / 1e6:.2f} MB, top-1 {result['top1_agreement']:.2%}, "
+                     f"decision {result['decision_agreement']:.2%}" if "top1_agreement" in result else "")
+            print(f"{name:<32}{result['median_ms']:>12}{result['min_ms']:>10}{base}{flag}{extra}")
+        if args.save_baseline:
+            print(f"\nSaved baseline to {args.baseline}")
+        elif "baseline_mismatches" in report:
+            print(f"\nNot compared: {args.baseline} was recorded on another host or with other arguments")
+            for mismatch in report["baseline_mismatches"]:
+                print(f"  {mismatch}")
+        elif not os.path.exists(args.baseline):
+            print(f"\nNo baseline at {args.baseline}; record one with --save-baseline")
+
+    if any(row["regression"] for row in comparison.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
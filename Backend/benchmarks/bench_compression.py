@@ -0,0 +1,121 @@
+"""
+Compares bytes-on-wire and CPU cost of gzip/brotli levels for the JSON
+endpoints, using synthetic payloads shaped like the real responses.
+
+    python benchmarks/bench_compression.py [--students 2000] [--days 30]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compression import brotli, compress
+
+FIRST_NAMES = ["Avijit", "Saanjh", "Soumya", "Sreyan", "Subham", "Utkarsh", "Asray", "Priya", "Rahul", "Anita"]
+LAST_NAMES = ["Chowdhury", "Nayak", "Panda", "Sarangi", "Sinha", "Kumar", "Sharma", "Das", "Mishra", "Patel"]
+EMOTIONS = ["neutral", "happy", "sad", "surprise", "angry"]
+
+
+def make_students(count):
+    return [{
+        "id": str(i + 1),
+        "name": f"{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)}",
+        "rollNumber": str(20240000 + i),
+        "class": random.choice(["IX", "X", "XI", "XII"]),
+        "section": random.choice("ABCD"),
+        "photoPath": f"/known_faces/student_{20240000 + i}/"
+    } for i in range(count)]
+
+
+def make_attendance(students, days):
+    records = []
+    for day in range(days):
+        date_str = f"2025-09-{day % 28 + 1:02d}"
+        for student in students:
+            present = random.random() < 0.9
+            records.append({
+                "studentId": student["id"],
+                "name": student["name"],
+                "rollNumber": student["rollNumber"],
+                "class": student["class"],
+                "section": student["section"],
+                "date": date_str,
+                "time": f"09:{random.randint(0, 59):02d}:{random.randint(0, 59):02d}" if present else "--:--:--",
+                "status": "Present" if present else "Absent"
+            })
+    return {"success": True, "data": records}
+
+
+def make_recognition(students, faces):
+    return {"success": True, "detectedFaces": [{
+        "name": student["name"],
+        "rollNumber": student["rollNumber"],
+        "spoofed": False,
+        "emotion": random.choice(EMOTIONS)
+    } for student in random.sample(students, faces)]}
+
+
+def measure(body, encoding, level, repeat):
+    kwargs = {"gzip_level": level} if encoding == "gzip" else {"brotli_quality": level}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        compressed = compress(body, encoding, **kwargs)
+    elapsed = (time.perf_counter() - start) / repeat
+    return len(compressed), elapsed * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--faces", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    random.seed(0)
+    students = make_students(args.students)
+    payloads = {
+        "/api/students": students,
+        "/api/attendance": make_attendance(students, args.days),
+        "/api/recognize": make_recognition(students, min(args.faces, len(students))),
+    }
+
+    codecs = [("gzip", level) for level in (1, 3, 6, 9)]
+    if brotli is not None:
+        codecs += [("br", quality) for quality in (1, 4, 6, 9, 11)]
+
+    results = []
+    for endpoint, payload in payloads.items():
+        body = json.dumps(payload).encode("utf-8")
+        for encoding, level in codecs:
+            size, ms = measure(body, encoding, level, args.repeat)
+            results.append({
+                "endpoint": endpoint,
+                "encoding": encoding,
+                "level": level,
+                "identity_bytes": len(body),
+                "compressed_bytes": size,
+                "ratio": round(len(body) / size, 2),
+                "ms": round(ms, 3),
+            })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'endpoint':<18}{'codec':<8}{'identity':>12}{'wire':>12}{'ratio':>8}{'ms':>10}")
+    for row in results:
+        codec = f"{row['encoding']}-{row['level']}"
+        print(f"{row['endpoint']:<18}{codec:<8}{row['identity_bytes']:>12}{row['compressed_bytes']:>12}"
+              f"{row['ratio']:>8}{row['ms']:>10}")
+    if brotli is None:
+        print("\nbrotli is not installed; only gzip was measured (pip install brotli).")
+
+
+if __name__ == "__main__":
+    main()
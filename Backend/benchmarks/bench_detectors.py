@@ -0,0 +1,118 @@
+"""
+Compares face detector backends on the labelled photos in known_faces/
+(one face per photo), optionally downscaled to mimic faces further from
+the camera, and picks the fastest one meeting a recall target.
+
+    python benchmarks/bench_detectors.py [--detectors hog,cnn,haar,opencv-dnn]
+        [--scales 1.0,0.5,0.25] [--upsample 1] [--target-recall 0.95] [--json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import detectors
+import ml_models
+
+
+def load_samples(known_faces_dir, scales):
+    """
+    Returns (label, scale, rgb_image) for every photo at every scale.
+    """
+    cv2 = ml_models.get_cv2()
+    samples = []
+    for name_folder in sorted(os.listdir(known_faces_dir)):
+        person_dir = os.path.join(known_faces_dir, name_folder)
+        if name_folder.startswith('.') or not os.path.isdir(person_dir):
+            continue
+        for filename in sorted(os.listdir(person_dir)):
+            if not filename.endswith(('.jpg', '.jpeg', '.png')):
+                continue
+            img = cv2.imread(os.path.join(person_dir, filename))
+            if img is None:
+                continue
+            rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            for scale in scales:
+                scaled = rgb if scale == 1.0 else cv2.resize(rgb, None, fx=scale, fy=scale,
+                                                             interpolation=cv2.INTER_AREA)
+                samples.append((name_folder, scale, scaled))
+    return samples
+
+
+def bench_detector(detect, samples, repeat):
+    found = 0
+    boxes = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        found = boxes = 0
+        for _label, _scale, img in samples:
+            faces = detect(img)
+            boxes += len(faces)
+            found += bool(faces)
+    elapsed = (time.perf_counter() - start) / repeat
+    return {
+        "images": len(samples),
+        "recall": round(found / len(samples), 3),
+        "faces_per_image": round(boxes / len(samples), 2),
+        "images_per_s": round(len(samples) / elapsed, 1),
+        "ms_per_image": round(elapsed * 1000 / len(samples), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--detectors", default=",".join(detectors.DETECTORS))
+    parser.add_argument("--scales", default="1.0,0.5,0.25")
+    parser.add_argument("--upsample", type=int, default=1)
+    parser.add_argument("--confidence", type=float, default=0.6)
+    parser.add_argument("--known-faces", default=os.path.join(BACKEND_DIR, "known_faces"))
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    samples = load_samples(args.known_faces, [float(scale) for scale in args.scales.split(",")])
+    if not samples:
+        raise SystemExit(f"No photos found under {args.known_faces}")
+
+    results = {}
+    for name in args.detectors.split(","):
+        config = dict(detectors.detector_config_from_env(), name=name,
+                      upsample=args.upsample, confidence=args.confidence)
+        try:
+            detect = detectors.build_detector(config)
+            detect(samples[0][2])  # load models outside the timed loop
+        except Exception as e:
+            results[name] = {"error": str(e)}
+            continue
+        results[name] = bench_detector(detect, samples, args.repeat)
+
+    eligible = [(result["ms_per_image"], name) for name, result in results.items()
+                if "error" not in result and result["recall"] >= args.target_recall]
+    recommended = min(eligible)[1] if eligible else None
+
+    if args.json:
+        print(json.dumps({"results": results, "target_recall": args.target_recall,
+                          "recommended": recommended}, indent=2))
+        return
+
+    print(f"{len(samples)} images (scales {args.scales}), upsample={args.upsample}")
+    print(f"{'detector':<12}{'recall':>8}{'faces/img':>11}{'img/s':>9}{'ms/img':>9}")
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:<12}  unavailable: {result['error']}")
+            continue
+        print(f"{name:<12}{result['recall']:>8}{result['faces_per_image']:>11}"
+              f"{result['images_per_s']:>9}{result['ms_per_image']:>9}")
+    if recommended:
+        print(f"\nFastest detector with recall >= {args.target_recall}: FACE_DETECTOR={recommended}")
+    else:
+        print(f"\nNo detector reached recall {args.target_recall}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Measures import time of the backend with `python -X importtime` and reports
+the slowest modules and whether the ML stack was pulled in at import.
+
+    python benchmarks/bench_import.py [--module app] [--top 15] [--json]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["cv2", "dlib", "face_recognition", "deepface", "tensorflow"]
+LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def measure(module):
+    """
+    Imports `module` in a fresh interpreter and returns the parsed
+    (self_us, cumulative_us, depth, name) entries plus peak RSS in KiB.
+    """
+    code = ("import importlib, resource; importlib.import_module(%r); "
+            "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)" % module)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=BACKEND_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((int(self_us), int(cumulative_us), len(indent) // 2, name))
+    return entries, int(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    entries, max_rss_kb = measure(args.module)
+    imported = {name for _, _, _, name in entries}
+    top_level = [entry for entry in entries if entry[2] == 0]
+    report = {
+        "module": args.module,
+        "total_ms": round(sum(entry[1] for entry in top_level) / 1000, 1),
+        "max_rss_mb": round(max_rss_kb / 1024, 1),
+        "heavy_modules_loaded": [name for name in HEAVY_MODULES if name in imported],
+        "slowest": [{"module": name, "cumulative_ms": round(cumulative / 1000, 1)}
+                    for _, cumulative, _, name in sorted(top_level, key=lambda e: -e[1])[:args.top]],
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"import {report['module']}: {report['total_ms']} ms, peak RSS {report['max_rss_mb']} MB")
+    print(f"heavy modules loaded at import: {', '.join(report['heavy_modules_loaded']) or 'none'}")
+    for row in report["slowest"]:
+        print(f"  {row['cumulative_ms']:>9} ms  {row['module']}")
+
+
+if __name__ == "__main__":
+    main()
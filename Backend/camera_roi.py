@@ -0,0 +1,110 @@
+import numpy as np
+
+# ROI polygons are lists of [x, y] points normalized to the frame (0..1), so
+# they survive camera resolution changes. Face boxes use face_recognition's
+# (top, right, bottom, left) order throughout.
+
+
+def validate_polygons(polygons):
+    """
+    Raises ValueError unless `polygons` is a list of polygons with at least
+    three normalized [x, y] points each.
+    """
+    if not isinstance(polygons, list):
+        raise ValueError("polygons must be a list")
+    for polygon in polygons:
+        if not isinstance(polygon, list) or len(polygon) < 3:
+            raise ValueError("each polygon needs at least three [x, y] points")
+        for point in polygon:
+            if (not isinstance(point, (list, tuple)) or len(point) != 2
+                    or not all(isinstance(value, (int, float)) and 0 <= value <= 1 for value in point)):
+                raise ValueError("points must be [x, y] pairs normalized to 0..1")
+
+
+def _merge_rects(rects):
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                a, b = rects[i], rects[j]
+                if a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]:
+                    rects[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del rects[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return rects
+
+
+def roi_rects(polygons, width, height):
+    """
+    Returns the pixel (left, top, right, bottom) rectangles to run detection
+    on: each polygon's bounding box, with overlapping boxes merged so no
+    area is scanned twice.
+    """
+    rects = []
+    for polygon in polygons:
+        xs = [point[0] * width for point in polygon]
+        ys = [point[1] * height for point in polygon]
+        left, top = max(0, int(min(xs))), max(0, int(min(ys)))
+        right, bottom = min(width, int(np.ceil(max(xs)))), min(height, int(np.ceil(max(ys))))
+        if right > left and bottom > top:
+            rects.append((left, top, right, bottom))
+    return _merge_rects(rects)
+
+
+def point_in_polygon(x, y, polygon):
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        xi, yi = polygon[i]
+        xj, yj = polygon[j]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def detect_in_roi(detect, rgb_img, polygons):
+    """
+    Runs `detect` only on the ROI rectangles of the frame and returns face
+    boxes in full-frame coordinates, keeping those centred inside a polygon.
+    """
+    height, width = rgb_img.shape[:2]
+    boxes = []
+    for left, top, right, bottom in roi_rects(polygons, width, height):
+        crop = np.ascontiguousarray(rgb_img[top:bottom, left:right])
+        for face_top, face_right, face_bottom, face_left in detect(crop):
+            box = (face_top + top, face_right + left, face_bottom + top, face_left + left)
+            center_x = (box[1] + box[3]) / 2 / width
+            center_y = (box[0] + box[2]) / 2 / height
+            if any(point_in_polygon(center_x, center_y, polygon) for polygon in polygons):
+                boxes.append(box)
+    return boxes
+
+
+def normalize_boxes(boxes, width, height):
+    return [(top / height, right / width, bottom / height, left / width) for top, right, bottom, left in boxes]
+
+
+def learn_roi(boxes, margin=0.1, coverage=0.98):
+    """
+    Learns a rectangular ROI polygon from normalized historical face boxes.
+    The extremes are trimmed to `coverage` of the boxes (ignoring the odd
+    stray detection) and padded by `margin` of the span on every side.
+    """
+    boxes = np.asarray(boxes, dtype=float)
+    tail = (1 - coverage) / 2 * 100
+    top = np.percentile(boxes[:, 0], tail)
+    bottom = np.percentile(boxes[:, 2], 100 - tail)
+    left = np.percentile(boxes[:, 3], tail)
+    right = np.percentile(boxes[:, 1], 100 - tail)
+
+    pad_x = (right - left) * margin
+    pad_y = (bottom - top) * margin
+    left, right = max(0.0, left - pad_x), min(1.0, right + pad_x)
+    top, bottom = max(0.0, top - pad_y), min(1.0, bottom + pad_y)
+    return [[[round(left, 4), round(top, 4)], [round(right, 4), round(top, 4)],
+             [round(right, 4), round(bottom, 4)], [round(left, 4), round(bottom, 4)]]]
@@ -0,0 +1,161 @@
+import argparse
+import os
+from datetime import date, timedelta
+
+import DataBase_attendance as db
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Repeated values (ids, names, class, status) are stored dictionary-encoded
+DICTIONARY_COLUMNS = ['reg_no', 'name', 'class', 'section', 'status']
+COLUMNS = ['reg_no', 'name', 'class', 'section', 'date', 'time', 'status']
+
+
+def _column_type(name):
+    # Explicit types, so that a month where every class is NULL matches the others
+    if name == 'date':
+        return pa.date32()
+    if name in DICTIONARY_COLUMNS:
+        return pa.dictionary(pa.int32(), pa.string())
+    return pa.string()
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Columnar export needs pyarrow (pip install pyarrow).")
+
+
+def _partition_dir(root, month, partition_by_class=False, class_name=None):
+    path = os.path.join(root, f"month={month}")
+    if partition_by_class:
+        path = os.path.join(path, f"class={class_name or 'unassigned'}")
+    return path
+
+
+def _covers_month(month, date_from, date_to):
+    first = date.fromisoformat(f"{month}-01")
+    last = (first.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return (not date_from or date_from <= first.isoformat()) and (not date_to or date_to >= last.isoformat())
+
+
+def _write_partition(root, month, rows, partition_by_class, complete=True):
+    groups = {}
+    if partition_by_class:
+        for row in rows:
+            groups.setdefault(row[2], []).append(row)
+    else:
+        groups[None] = rows
+
+    if not complete:
+        for class_name in groups:
+            out_file = os.path.join(_partition_dir(root, month, partition_by_class, class_name), "part-0.parquet")
+            if os.path.exists(out_file):
+                raise FileExistsError(f"{out_file} already exists and this export only covers part of {month}; "
+                                      "export the whole month or write to another directory")
+
+    written = []
+    for class_name, group in groups.items():
+        columns = {name: [row[i] for row in group] for i, name in enumerate(COLUMNS)}
+        columns['date'] = [date.fromisoformat(value) for value in columns['date']]
+        if partition_by_class:
+            del columns['class']
+
+        table = pa.table({
+            name: pa.array(values, _column_type(name)) for name, values in columns.items()
+        })
+        out_dir = _partition_dir(root, month, partition_by_class, class_name)
+        os.makedirs(out_dir, exist_ok=True)
+        out_file = os.path.join(out_dir, "part-0.parquet")
+        pq.write_table(table, out_file, compression='zstd')
+        written.append(out_file)
+    return written
+
+
+def export_attendance_parquet(root, date_from=None, date_to=None, class_name=None, section=None,
+                              partition_by_class=False):
+    """
+    Writes attendance history as Parquet under `root`, one file per month
+    (and per class when `partition_by_class` is set) in hive-style
+    month=YYYY-MM[/class=X] directories. Only one month of rows is held in
+    memory at a time. Returns the list of files written.
+
+    Re-exporting a month replaces its file. A partition that the export
+    covers only in part (a range starting or ending mid-month, a section
+    filter, or a class filter without `partition_by_class`) is written only
+    if it has no file yet; otherwise FileExistsError is raised rather than
+    replacing the archive with partial data. Months written before the
+    error are complete.
+    """
+    _require_pyarrow()
+    # Filters that leave out rows of every partition they touch
+    filtered = bool(section) or (bool(class_name) and not partition_by_class)
+
+    written = []
+    month = None
+    rows = []
+    for row in db.iter_attendance(date_from, date_to, class_name, section):
+        row_month = row[4][:7]
+        if row_month != month:
+            if rows:
+                written += _write_partition(root, month, rows, partition_by_class,
+                                            not filtered and _covers_month(month, date_from, date_to))
+            month, rows = row_month, []
+        rows.append(row)
+
+    if rows:
+        written += _write_partition(root, month, rows, partition_by_class,
+                                    not filtered and _covers_month(month, date_from, date_to))
+    return written
+
+
+def load_attendance_parquet(root, columns=None, months=None, class_name=None):
+    """
+    Loads an archive written by export_attendance_parquet as a pyarrow Table.
+
+    Only the requested `columns` are read, and `months` (YYYY-MM strings)
+    and `class_name` prune whole partitions before any file is opened.
+    """
+    _require_pyarrow()
+
+    # Partition values are always strings; otherwise class=10 would be read as an int
+    fields = [("month", pa.string())]
+    month_dirs = [name for name in os.listdir(root) if name.startswith("month=")]
+    if month_dirs and any(name.startswith("class=") for name in os.listdir(os.path.join(root, month_dirs[0]))):
+        fields.append(("class", pa.string()))
+    partitioning = ds.HivePartitioning.discover(schema=pa.schema(fields))
+
+    dataset = ds.dataset(root, format="parquet", partitioning=partitioning)
+    filters = []
+    if months:
+        filters.append(ds.field("month").isin(list(months)))
+    if class_name:
+        filters.append(ds.field("class") == class_name)
+
+    expression = None
+    for condition in filters:
+        expression = condition if expression is None else expression & condition
+    return dataset.to_table(columns=columns, filter=expression)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive attendance history as month-partitioned Parquet.")
+    parser.add_argument("root", help="output directory")
+    parser.add_argument("--from", dest="date_from", help="first date, YYYY-MM-DD")
+    parser.add_argument("--to", dest="date_to", help="last date, YYYY-MM-DD")
+    parser.add_argument("--class", dest="class_name")
+    parser.add_argument("--section")
+    parser.add_argument("--by-class", action="store_true", help="also partition by class")
+    args = parser.parse_args()
+
+    try:
+        files = export_attendance_parquet(args.root, args.date_from, args.date_to, args.class_name,
+                                          args.section, args.by_class)
+    except FileExistsError as e:
+        parser.exit(1, f"{e}\n")
+    for path in files:
+        print(f"Wrote {path}")
@@ -0,0 +1,103 @@
+import gzip
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/csv', 'text/plain')
+
+
+def compress(body, encoding, gzip_level=6, brotli_quality=4):
+    """
+    Compresses `body` with the given content coding ('br' or 'gzip').
+    """
+    if encoding == 'br':
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+def choose_encoding(accept_encodings):
+    """
+    Picks the best coding the client accepts, preferring brotli when available.
+    """
+    candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+    best = None
+    best_quality = 0
+    for encoding in candidates:
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class ResponseCompressor:
+    """
+    Negotiated gzip/brotli compression for JSON-heavy responses.
+
+    Bodies smaller than `min_size` are sent as-is since compressing them
+    costs more CPU than it saves on the wire. Responses that carry a strong
+    ETag (e.g. the cached roster) have their compressed bytes memoized so
+    repeat hits don't recompress the same body.
+    """
+
+    def __init__(self, app=None, min_size=1024, gzip_level=6, brotli_quality=4, memo_entries=64):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.memo_entries = memo_entries
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.after_request(self.after_request)
+
+    def _compress_memoized(self, body, encoding, etag):
+        if etag is None:
+            return compress(body, encoding, self.gzip_level, self.brotli_quality)
+
+        key = (etag, encoding)
+        with self._lock:
+            compressed = self._memo.get(key)
+            if compressed is not None:
+                self._memo.move_to_end(key)
+                return compressed
+
+        compressed = compress(body, encoding, self.gzip_level, self.brotli_quality)
+        with self._lock:
+            self._memo[key] = compressed
+            while len(self._memo) > self.memo_entries:
+                self._memo.popitem(last=False)
+        return compressed
+
+    def after_request(self, response):
+        response.vary.add('Accept-Encoding')
+
+        if (response.status_code < 200 or response.status_code in (204, 304)
+                or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        body = response.get_data()
+        if len(body) < self.min_size:
+            return response
+
+        etag, weak = response.get_etag()
+        response.set_data(self._compress_memoized(body, encoding, None if weak else etag))
+        response.headers['Content-Encoding'] = encoding
+        if etag is not None:
+            # The compressed bytes differ from the identity body, so the
+            # validator can only be weak; If-None-Match still matches it.
+            response.set_etag(etag, weak=True)
+        return response
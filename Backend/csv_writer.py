@@ -0,0 +1,138 @@
+import atexit
+import csv
+import io
+import os
+import tempfile
+import threading
+import time
+
+CSV_HEADER = ['Name', 'Roll Number', 'Date', 'Time', 'Status']
+
+
+class DailyAttendanceCsvWriter:
+    """
+    Long-lived appender for the per-day attendance_<date>.csv files.
+
+    `append` only queues the row in memory. A background thread writes the
+    queue to a single open handle every `flush_interval` seconds and fsyncs
+    it every `fsync_interval` seconds. The handle is rotated when rows for a
+    new date arrive (i.e. after midnight). Rows that fail to write stay
+    queued for the next flush.
+
+    Every gunicorn worker has its own writer on the same files, so the files
+    are opened with O_APPEND and each flush writes a day's rows in a single
+    write() call, which keeps rows from different workers whole. A day's
+    file is created by linking a finished header-only file into place, so
+    exactly one worker's header wins.
+    """
+
+    def __init__(self, directory, flush_interval=1.0, fsync_interval=5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self._pending = []
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._fd = None
+        self._date = None
+        self._last_fsync = time.monotonic()
+        self._thread = None
+        self._stop = threading.Event()
+        atexit.register(self.close)
+
+    def append(self, student_name, roll_number, date_str, time_str, status='Present'):
+        """
+        Queues one attendance row; it reaches disk on the next flush.
+        """
+        with self._lock:
+            self._pending.append((student_name, roll_number, date_str, time_str, status))
+            if self._thread is None or not self._thread.is_alive():
+                # Started lazily so forked workers each get their own flusher
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='attendance-csv-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing attendance CSV: {e}")
+
+    def _create_with_header(self, csv_file):
+        fd, tmp_file = tempfile.mkstemp(prefix='.attendance-', suffix='.csv', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'w', newline='', encoding='utf-8') as f:
+                csv.writer(f).writerow(CSV_HEADER)
+            try:
+                os.link(tmp_file, csv_file)
+            except FileExistsError:
+                pass
+        finally:
+            os.unlink(tmp_file)
+
+    def _open(self, date_str):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            self._date = None
+        os.makedirs(self.directory, exist_ok=True)
+        csv_file = os.path.join(self.directory, f'attendance_{date_str}.csv')
+        if not os.path.exists(csv_file):
+            self._create_with_header(csv_file)
+        self._fd = os.open(csv_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._date = date_str
+
+    def _write(self, rows):
+        buffer = io.StringIO(newline='')
+        csv.writer(buffer).writerows(rows)
+        data = buffer.getvalue().encode('utf-8')
+        while data:
+            data = data[os.write(self._fd, data):]
+
+    def flush(self, fsync=False):
+        """
+        Writes queued rows to their daily files, rotating the handle per date.
+        On an I/O error the unwritten rows go back to the front of the queue
+        and the error is raised.
+        """
+        with self._lock:
+            rows, self._pending = self._pending, []
+
+        with self._io_lock:
+            written = 0
+            try:
+                while written < len(rows):
+                    date_str = rows[written][2]
+                    end = written
+                    while end < len(rows) and rows[end][2] == date_str:
+                        end += 1
+                    if date_str != self._date:
+                        self._open(date_str)
+                    self._write(rows[written:end])
+                    written = end
+            except Exception:
+                with self._lock:
+                    self._pending[:0] = rows[written:]
+                raise
+
+            if self._fd is None:
+                return
+            now = time.monotonic()
+            if fsync or now - self._last_fsync >= self.fsync_interval:
+                os.fsync(self._fd)
+                self._last_fsync = now
+
+    def close(self):
+        """
+        Flushes everything still queued and releases the file handle.
+        """
+        self._stop.set()
+        try:
+            self.flush(fsync=True)
+        finally:
+            with self._io_lock:
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+                    self._date = None
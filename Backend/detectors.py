@@ -0,0 +1,114 @@
+import os
+
+import ml_models
+
+# Detector selection, overridable per deployment through the environment:
+#   FACE_DETECTOR        hog (default), cnn, opencv-dnn or haar
+#   DETECTOR_UPSAMPLE    dlib upsampling passes, higher finds smaller faces (default 1)
+#   DETECTOR_CONFIDENCE  minimum score for opencv-dnn detections (default 0.6)
+#   OPENCV_DNN_PROTO / OPENCV_DNN_MODEL  Caffe files of OpenCV's res10 SSD face model
+DETECTORS = ("hog", "cnn", "opencv-dnn", "haar")
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+
+
+def detector_config_from_env():
+    return {
+        "name": os.environ.get("FACE_DETECTOR", "hog"),
+        "upsample": int(os.environ.get("DETECTOR_UPSAMPLE", 1)),
+        "confidence": float(os.environ.get("DETECTOR_CONFIDENCE", 0.6)),
+        "dnn_proto": os.environ.get("OPENCV_DNN_PROTO", os.path.join(MODELS_DIR, "deploy.prototxt")),
+        "dnn_model": os.environ.get("OPENCV_DNN_MODEL",
+                                    os.path.join(MODELS_DIR, "res10_300x300_ssd_iter_140000.caffemodel")),
+    }
+
+
+def _clip_boxes(boxes, shape):
+    height, width = shape[:2]
+    clipped = []
+    for top, right, bottom, left in boxes:
+        top, left = max(0, int(top)), max(0, int(left))
+        bottom, right = min(height, int(bottom)), min(width, int(right))
+        if bottom > top and right > left:
+            clipped.append((top, right, bottom, left))
+    return clipped
+
+
+def _dlib_detector(model, upsample):
+    face_recognition = ml_models.get_face_recognition()
+
+    def detect(rgb_img):
+        return face_recognition.face_locations(rgb_img, number_of_times_to_upsample=upsample, model=model)
+    return detect
+
+
+def _haar_detector():
+    cv2 = ml_models.get_cv2()
+    cascade = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml"))
+
+    def detect(rgb_img):
+        gray = cv2.cvtColor(rgb_img, cv2.COLOR_RGB2GRAY)
+        faces = cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(40, 40))
+        return _clip_boxes([(y, x + w, y + h, x) for (x, y, w, h) in faces], rgb_img.shape)
+    return detect
+
+
+def _dnn_detector(proto, model, confidence):
+    cv2 = ml_models.get_cv2()
+    if not (os.path.exists(proto) and os.path.exists(model)):
+        raise FileNotFoundError(
+            f"opencv-dnn needs {proto} and {model} (OpenCV's res10_300x300 SSD face detector).")
+    net = cv2.dnn.readNetFromCaffe(proto, model)
+    net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+    def detect(rgb_img):
+        height, width = rgb_img.shape[:2]
+        bgr = cv2.cvtColor(rgb_img, cv2.COLOR_RGB2BGR)
+        blob = cv2.dnn.blobFromImage(cv2.resize(bgr, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0))
+        net.setInput(blob)
+        detections = net.forward()[0, 0]
+        boxes = []
+        for score, x1, y1, x2, y2 in detections[:, 2:7]:
+            if score >= confidence:
+                boxes.append((y1 * height, x2 * width, y2 * height, x1 * width))
+        return _clip_boxes(boxes, rgb_img.shape)
+    return detect
+
+
+def build_detector(config):
+    """
+    Returns a callable mapping an RGB image to (top, right, bottom, left)
+    face boxes, the format face_recognition.face_encodings expects.
+    """
+    name = config["name"]
+    if name in ("hog", "cnn"):
+        return _dlib_detector(name, config["upsample"])
+    if name == "haar":
+        return _haar_detector()
+    if name == "opencv-dnn":
+        return _dnn_detector(config["dnn_proto"], config["dnn_model"], config["confidence"])
+    raise ValueError(f"Unknown face detector '{name}', expected one of {', '.join(DETECTORS)}")
+
+
+# The detector used by this process, built on first use from `_config`
+_config = detector_config_from_env()
+_detector = None
+
+
+def configure(config):
+    """
+    Selects the detector for this process (e.g. in a pool worker initializer).
+    """
+    global _config, _detector
+    _config = dict(config)
+    _detector = None
+
+
+def get_config():
+    return dict(_config)
+
+
+def get_detector():
+    global _detector
+    if _detector is None:
+        _detector = build_detector(_config)
+    return _detector
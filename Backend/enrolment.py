@@ -0,0 +1,166 @@
+import multiprocessing
+import os
+import re
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import DataBase_attendance as db
+import ml_models
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+# "Jane-Doe_107.png" carries its roll number; other names get the next free one
+NAME_WITH_ROLL = re.compile(r"^(?P<name>.+?)_(?P<roll>\d+)$")
+
+
+def iter_zip_images(zip_file):
+    """
+    Yields (member name, bytes) for every image in the archive, in name
+    order, reading members one at a time instead of extracting them.
+    """
+    with zipfile.ZipFile(zip_file, "r") as archive:
+        members = sorted(
+            info.filename for info in archive.infolist()
+            if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS)
+            and not any(part.startswith(('.', '__MACOSX')) for part in info.filename.split('/'))
+        )
+        for name in members:
+            yield name, archive.read(name)
+
+
+def encode_photo(img_bytes):
+    """
+    Returns the encoding of the first face in an encoded image, or None.
+    Runs in the encode_images pool processes.
+    """
+    cv2 = ml_models.get_cv2()
+    img = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+    encodings = ml_models.get_face_recognition().face_encodings(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+    return encodings[0] if encodings else None
+
+
+def encode_images(images, workers):
+    """
+    Encodes (key, bytes) pairs in a spawned process pool and yields
+    (key, bytes, encoding) in input order; workers=0 encodes inline. At most
+    a few images per worker are held in memory at once. Spawned workers
+    keep dlib out of the calling process, which may be about to fork.
+    """
+    if workers == 0:
+        for name, img_bytes in images:
+            yield name, img_bytes, encode_photo(img_bytes)
+        return
+
+    window = deque()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        for name, img_bytes in images:
+            window.append((name, img_bytes, executor.submit(encode_photo, img_bytes)))
+            if len(window) >= workers * 4:
+                name, img_bytes, future = window.popleft()
+                yield name, img_bytes, future.result()
+        while window:
+            name, img_bytes, future = window.popleft()
+            yield name, img_bytes, future.result()
+
+
+def _next_roll_number(cursor):
+    cursor.execute("SELECT MAX(CAST(reg_no AS INTEGER)) FROM students WHERE reg_no GLOB '[0-9]*'")
+    highest = cursor.fetchone()[0]
+    return max(101, (highest or 0) + 1)
+
+
+def _same_student(stored_name, student_name, roll_number):
+    # A stored name equal to the roll number is a placeholder (see gallery.resolve_student_name)
+    return stored_name == roll_number or stored_name.casefold().split() == student_name.casefold().split()
+
+
+def enrol_from_zip(zip_file, photos_dir, gallery=None, class_name=None, section=None, workers=None):
+    """
+    Registers one student per image in a ZIP archive in a single pass:
+    images are read straight from the archive and encoded in a process pool
+    (workers=0 encodes inline), each photo is saved as
+    photos_dir/<Name>_<roll>/<roll>.<ext> (the known_faces layout) and all
+    students are inserted in one transaction. The new encodings are stored
+    as gallery additions, which every recognition process appends to its
+    gallery on its next sync; `gallery`, if given, is synced right away.
+
+    A file named <name>_<roll> keeps its roll number, and adds a photo to
+    that student if they are already enrolled under the same name. If the
+    roll number belongs to someone else the file is reported as a conflict
+    and nothing is saved for it. Other files are numbered after the highest
+    existing roll number (from 101).
+
+    Returns {"enrolled": [{name, rollNumber, photoPath, encoded}],
+    "noFace": [member names], "conflicts": [{file, name, rollNumber, existingName}]}.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    conn = db.sqlite3.connect("attendance_demo.db")
+    try:
+        cursor = conn.cursor()
+        next_roll = _next_roll_number(cursor)
+        # Roll numbers already taken, including the ones assigned earlier in this archive
+        taken = dict(cursor.execute("SELECT reg_no, name FROM students WHERE reg_no IS NOT NULL"))
+        students, enrolled, no_face, conflicts = [], [], [], []
+        encodings, names, roll_numbers = [], [], []
+
+        for member, img_bytes, encoding in encode_images(iter_zip_images(zip_file), workers):
+            stem, ext = os.path.splitext(os.path.basename(member))
+            match = NAME_WITH_ROLL.match(stem)
+            if match:
+                stem, roll_number = match.group("name"), match.group("roll")
+            else:
+                roll_number = str(next_roll)
+                next_roll += 1
+            student_name = stem.replace('-', ' ').replace('_', ' ').title()
+
+            stored_name = taken.get(roll_number)
+            if stored_name is not None and not _same_student(stored_name, student_name, roll_number):
+                conflicts.append({"file": member, "name": student_name, "rollNumber": roll_number,
+                                  "existingName": stored_name})
+                continue
+            if stored_name is not None and stored_name != roll_number:
+                # Already enrolled: keep the stored name, as gallery.load() does
+                student_name = stored_name
+            taken[roll_number] = student_name
+
+            person_dir = os.path.join(photos_dir, f"{student_name.replace(' ', '_')}_{roll_number}")
+            os.makedirs(person_dir, exist_ok=True)
+            photo_path = os.path.join(person_dir, f"{roll_number}{ext.lower()}")
+            copy = 2
+            while os.path.exists(photo_path):
+                photo_path = os.path.join(person_dir, f"{roll_number}_{copy}{ext.lower()}")
+                copy += 1
+            with open(photo_path, "wb") as f:
+                f.write(img_bytes)
+
+            students.append((student_name, roll_number, class_name, section, photo_path))
+            enrolled.append({"name": student_name, "rollNumber": roll_number, "photoPath": photo_path,
+                             "encoded": encoding is not None})
+            if encoding is None:
+                no_face.append(member)
+            else:
+                encodings.append(encoding)
+                names.append(student_name)
+                roll_numbers.append(roll_number)
+
+        with conn:
+            conn.executemany("""
+                INSERT OR IGNORE INTO students (name, reg_no, class, section, photo_path)
+                VALUES (?, ?, ?, ?, ?)
+            """, students)
+    finally:
+        conn.close()
+
+    if students:
+        db.notify_roster_change()
+    if encodings:
+        db.record_gallery_additions(encodings, names, roll_numbers)
+        if gallery is not None:
+            gallery.sync()
+    return {"enrolled": enrolled, "noFace": no_face, "conflicts": conflicts}
@@ -0,0 +1,405 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+import DataBase_attendance as db
+import enrolment
+import quantization
+
+
+# float32 and float64 match exactly; int8 and pq search compressed codes
+# and re-rank the closest candidates against the exact encodings
+PRECISIONS = ("float32", "float64", "int8", "pq")
+# A quantizer fitted on few rows (PQ wants 256 per codebook) or on less
+# than half of the current gallery is refitted when rows are appended
+REFIT_MIN_ROWS = 1024
+REFIT_GROWTH = 2.0
+
+
+class GallerySnapshot:
+    """
+    Immutable view of the gallery: an (N, 128) encoding matrix and the
+    names/roll numbers of its rows. Requests hold on to one snapshot, so a
+    reload never changes the gallery underneath a running match.
+    """
+
+    def __init__(self, encodings, names, roll_numbers, dtype=np.float32):
+        self.encodings = np.ascontiguousarray(encodings, dtype=dtype)
+        self.names = names
+        self.roll_numbers = roll_numbers
+        self.precision = np.dtype(dtype).name
+        self._squared_norms = np.einsum('ij,ij->i', self.encodings, self.encodings)
+
+    def __len__(self):
+        return len(self.names)
+
+    def nbytes(self):
+        """
+        Resident bytes of the matching data (names excluded).
+        """
+        return self.encodings.nbytes + self._squared_norms.nbytes
+
+    def distances(self, encodings):
+        """
+        Euclidean distances from each row of an (M, 128) matrix to every
+        gallery row, as one (M, N) matrix product.
+        """
+        encodings = np.asarray(encodings, dtype=self.encodings.dtype).reshape(-1, self.encodings.shape[1])
+        squared = (np.einsum('ij,ij->i', encodings, encodings)[:, None]
+                   + self._squared_norms[None, :]
+                   - 2.0 * encodings @ self.encodings.T)
+        return np.sqrt(np.maximum(squared, 0.0))
+
+    def nearest(self, encodings, k=1):
+        """
+        Returns (indices, distances), each (M, min(k, N)), of the k closest
+        gallery rows to each encoding, closest first.
+        """
+        distances = self.distances(encodings)
+        return _top_k(distances, k)
+
+    def top_students(self, encodings, k, rows_per_student=4):
+        """
+        For each encoding, returns up to k (index, distance) pairs for the
+        closest distinct roll numbers, closest first. A student can have
+        several photos, so k * rows_per_student rows are searched first and
+        the search is widened for any encoding whose closest rows hold fewer
+        than k students, until the whole gallery has been searched.
+        """
+        encodings = np.asarray(encodings).reshape(-1, self.encodings.shape[1])
+        results = [None] * len(encodings)
+        pending = np.arange(len(encodings))
+        window = k * rows_per_student
+        while len(pending):
+            indices, distances = self.nearest(encodings[pending], window)
+            searched_all = window >= len(self)
+            unresolved = []
+            for query, row_indices, row_distances in zip(pending.tolist(), indices.tolist(), distances.tolist()):
+                best = self._distinct_students(row_indices, row_distances, k)
+                if len(best) == k or searched_all:
+                    results[query] = best
+                else:
+                    unresolved.append(query)
+            pending = np.array(unresolved, np.int64)
+            window *= 2
+        return results
+
+    def _distinct_students(self, indices, distances, k):
+        seen = set()
+        best = []
+        for index, distance in zip(indices, distances):
+            if self.roll_numbers[index] in seen:
+                continue
+            seen.add(self.roll_numbers[index])
+            best.append((index, distance))
+            if len(best) == k:
+                break
+        return best
+
+    def extend(self, encodings, names, roll_numbers):
+        return GallerySnapshot(np.vstack([self.encodings, np.asarray(encodings, self.encodings.dtype)]),
+                               self.names + list(names), self.roll_numbers + list(roll_numbers),
+                               self.encodings.dtype)
+
+
+class QuantizedGallerySnapshot(GallerySnapshot):
+    """
+    Gallery searched through compressed codes: int8 scalar quantization
+    (128 B per face) or product quantization (16 B per face). The `rerank`
+    closest candidates by approximate distance are re-scored exactly
+    against float32 encodings kept in a read-only memory map, so only those
+    candidates' rows are paged in. `fitted_rows` is the gallery size the
+    quantizer was fitted on.
+    """
+
+    def __init__(self, encodings, names, roll_numbers, method="int8", rerank=32, quantizer=None, fitted_rows=None):
+        exact = np.ascontiguousarray(encodings, dtype=np.float32)
+        if quantizer is None:
+            quantizer = (quantization.ScalarQuantizer if method == "int8" else quantization.ProductQuantizer).fit(exact)
+            fitted_rows = len(exact)
+        self.quantizer = quantizer
+        self.fitted_rows = fitted_rows
+        self.codes = quantizer.encode(exact)
+        self._code_norms = quantizer.code_norms(self.codes)
+        self.encodings = quantization.map_read_only(exact)
+        self.names = names
+        self.roll_numbers = roll_numbers
+        self.precision = method
+        self.rerank = rerank
+
+    def nbytes(self):
+        return (self.codes.nbytes + self.quantizer.nbytes()
+                + (self._code_norms.nbytes if self._code_norms is not None else 0))
+
+    def distances(self, encodings):
+        """
+        Approximate distances (M, N) computed from the codes alone.
+        """
+        queries = np.asarray(encodings, np.float32).reshape(-1, self.encodings.shape[1])
+        squared = self.quantizer.squared_distances(queries, self.codes, self._code_norms)
+        return np.sqrt(np.maximum(squared, 0.0))
+
+    def nearest(self, encodings, k=1):
+        queries = np.asarray(encodings, np.float32).reshape(-1, self.encodings.shape[1])
+        if not len(self) or not len(queries):
+            return np.empty((len(queries), 0), np.int64), np.empty((len(queries), 0), np.float32)
+        candidates, _ = _top_k(self.distances(queries), max(k, self.rerank))
+        exact = np.linalg.norm(self.encodings[candidates.ravel()].reshape(*candidates.shape, -1)
+                               - queries[:, None, :], axis=2)
+        order = np.argsort(exact, axis=1)[:, :k]
+        return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(exact, order, axis=1)
+
+    def extend(self, encodings, names, roll_numbers):
+        """
+        Appends rows, coding them with the existing quantizer unless the
+        gallery has outgrown it (see REFIT_MIN_ROWS and REFIT_GROWTH), in
+        which case the quantizer is refitted on all rows.
+        """
+        rows = np.vstack([self.encodings, np.asarray(encodings, np.float32)])
+        refit = self.fitted_rows < REFIT_MIN_ROWS or len(rows) > REFIT_GROWTH * self.fitted_rows
+        return QuantizedGallerySnapshot(rows, self.names + list(names), self.roll_numbers + list(roll_numbers),
+                                        self.precision, self.rerank,
+                                        None if refit else self.quantizer, None if refit else self.fitted_rows)
+
+
+def _top_k(distances, k):
+    k = min(k, distances.shape[1])
+    if k == 0:
+        return np.empty((len(distances), 0), np.int64), np.empty((len(distances), 0), distances.dtype)
+    if k < distances.shape[1]:
+        candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(k), distances.shape).copy()
+    picked = np.take_along_axis(distances, candidates, axis=1)
+    order = np.argsort(picked, axis=1)
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(picked, order, axis=1)
+
+
+def match_confidence(distances, tolerance):
+    """
+    Scores a match from the distances of the closest distinct students,
+    closest first: how far the best distance is below both the tolerance and
+    the runner-up, as a fraction of the tolerance. 1.0 is an exact match
+    with no other student within tolerance; 0.0 is no match, a match right
+    on the tolerance or a tie with the runner-up.
+    """
+    if not distances or distances[0] > tolerance:
+        return 0.0
+    runner_up = min(distances[1], tolerance) if len(distances) > 1 else tolerance
+    return max(0.0, (runner_up - distances[0]) / tolerance)
+
+
+def build_snapshot(encodings, names, roll_numbers, precision="float32", rerank=32):
+    """
+    Builds the snapshot type for a precision from PRECISIONS.
+    """
+    if precision in ("float32", "float64"):
+        return GallerySnapshot(encodings, names, roll_numbers, np.dtype(precision))
+    if precision in ("int8", "pq"):
+        return QuantizedGallerySnapshot(encodings, names, roll_numbers, precision, rerank)
+    raise ValueError(f"Unknown gallery precision '{precision}', expected one of {', '.join(PRECISIONS)}")
+
+
+EMPTY_SNAPSHOT = GallerySnapshot(np.empty((0, 128)), [], [])
+
+
+def resolve_student_name(cursor, folder_name, roll_number):
+    """
+    Prefers the name stored in the database over the folder name, unless the
+    database only has the roll number as a placeholder name.
+    """
+    cursor.execute("SELECT name FROM students WHERE reg_no = ?", (roll_number,))
+    result = cursor.fetchone()
+
+    if result and result[0] != roll_number:
+        return result[0]
+    return folder_name.replace('-', ' ').title()
+
+
+def _read_photos(photos):
+    for key, path in photos:
+        with open(path, "rb") as f:
+            yield key, f.read()
+
+
+def encode_known_faces(known_faces_dir, precision="float32", rerank=32, workers=None):
+    """
+    Encodes every <name>_<roll number>/<photo> under `known_faces_dir` and
+    returns the resulting snapshot at the given precision. The photos are
+    encoded in spawned processes (see enrolment.encode_images), so the
+    caller never imports dlib; workers=0 encodes inline.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    photos = []
+
+    conn = db.sqlite3.connect("attendance_demo.db")
+    cursor = conn.cursor()
+    try:
+        for name_folder in sorted(os.listdir(known_faces_dir)):
+            person_dir = os.path.join(known_faces_dir, name_folder)
+            if name_folder.startswith('.') or not os.path.isdir(person_dir):
+                continue
+
+            name, roll_number = name_folder.rsplit('_', 1)
+            actual_name = resolve_student_name(cursor, name, roll_number)
+
+            for filename in sorted(os.listdir(person_dir)):
+                if filename.startswith('.') or not filename.endswith(('.jpg', '.jpeg', '.png')):
+                    continue
+                photos.append(((actual_name, roll_number, filename), os.path.join(person_dir, filename)))
+    finally:
+        conn.close()
+
+    encodings = []
+    names = []
+    roll_numbers = []
+    for (actual_name, roll_number, filename), _img_bytes, encoding in enrolment.encode_images(_read_photos(photos), workers):
+        if encoding is not None:
+            encodings.append(encoding)
+            names.append(actual_name)
+            roll_numbers.append(roll_number)
+            print(f"Loaded encoding for {actual_name} ({roll_number}) from {filename}")
+
+    if not encodings:
+        return EMPTY_SNAPSHOT
+    return build_snapshot(np.vstack(encodings), names, roll_numbers, precision, rerank)
+
+
+class FaceGallery:
+    """
+    Owns the known-face encodings and their loading lifecycle.
+
+    Nothing is encoded at import time. Call `load()` to build the gallery
+    synchronously (e.g. in a pre-fork master, so workers share the matrix
+    copy-on-write) or `start_loading()` to build it on a background thread
+    while the server already answers roster requests. `ready` is set once
+    the first load finishes. `precision` picks the snapshot representation
+    (see PRECISIONS) and `workers` the number of spawned processes that
+    encode the photos. Students enrolled later by any process are appended
+    from the gallery_additions table by `sync()`; `version` is the last
+    addition included.
+    """
+
+    def __init__(self, known_faces_dir, precision="float32", rerank=32, workers=None):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown gallery precision '{precision}', expected one of {', '.join(PRECISIONS)}")
+        self.known_faces_dir = known_faces_dir
+        self.precision = precision
+        self.rerank = rerank
+        self.workers = workers
+        self.ready = threading.Event()
+        self.error = None
+        self._snapshot = EMPTY_SNAPSHOT
+        self._lock = threading.Lock()
+        self._thread = None
+        self.version = 0
+        self._sync_lock = threading.Lock()
+        self._last_sync = 0.0
+
+    def snapshot(self):
+        return self._snapshot
+
+    def load(self):
+        """
+        Re-encodes the known_faces directory and swaps the new gallery in.
+        """
+        print("Loading known faces...")
+        try:
+            # Photos enrolled during the load are on disk and may be added again; top_students dedupes
+            version = db.get_gallery_version()
+            snapshot = encode_known_faces(self.known_faces_dir, self.precision, self.rerank, self.workers)
+        except Exception as e:
+            self.error = str(e)
+            print(f"Error loading known faces: {e}")
+            raise
+        self.version = version
+        self.replace(snapshot)
+        print(f"Loaded {len(snapshot)} face encodings")
+        return snapshot
+
+    def replace(self, snapshot):
+        """
+        Swaps in an already built snapshot and marks the gallery ready.
+        """
+        self._snapshot = snapshot
+        self.error = None
+        self.ready.set()
+
+    def add(self, encodings, names, roll_numbers):
+        """
+        Appends newly enrolled encodings to the loaded gallery. Before the
+        first load finishes there is nothing to append to; the load picks
+        the new photos up from disk instead.
+        """
+        with self._lock:
+            if not self.ready.is_set():
+                return False
+            current = self._snapshot
+            if len(current):
+                self._snapshot = current.extend(encodings, names, roll_numbers)
+            else:
+                self._snapshot = build_snapshot(encodings, list(names), list(roll_numbers),
+                                                self.precision, self.rerank)
+        return True
+
+    def sync(self):
+        """
+        Appends the gallery additions made since the last load or sync.
+        Returns the number of encodings appended.
+        """
+        with self._sync_lock:
+            if not self.ready.is_set():
+                return 0
+            version, encodings, names, roll_numbers = db.get_gallery_additions(self.version)
+            if names and self.add(np.vstack([np.frombuffer(encoding, "<f8") for encoding in encodings]),
+                                  names, roll_numbers):
+                self.version = version
+                print(f"Added {len(names)} enrolled face encodings")
+            return len(names)
+
+    def _sync_quietly(self):
+        try:
+            self.sync()
+        except Exception as e:
+            print(f"Error syncing gallery additions: {e}")
+
+    def sync_in_background(self, interval):
+        """
+        Starts a sync on a background thread if the last one started more
+        than `interval` seconds ago, so request threads never wait for it.
+        """
+        now = time.monotonic()
+        if now - self._last_sync < interval or not self.ready.is_set():
+            return
+        self._last_sync = now
+        threading.Thread(target=self._sync_quietly, name="gallery-sync", daemon=True).start()
+
+    def _load_quietly(self):
+        try:
+            self.load()
+        except Exception:
+            pass
+
+    def start_loading(self):
+        """
+        Loads the gallery on a background thread unless a load is running.
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._load_quietly, name="gallery-loader", daemon=True)
+                self._thread.start()
+        return self._thread
+
+    def status(self):
+        if self.ready.is_set():
+            state = "ready"
+        elif self.error is not None:
+            state = "failed"
+        else:
+            state = "loading" if self._thread is not None and self._thread.is_alive() else "cold"
+        snapshot = self._snapshot
+        return {"state": state, "faces": len(snapshot), "precision": self.precision,
+                "bytes": snapshot.nbytes(), "error": self.error}
@@ -0,0 +1,50 @@
+# Production serving profile: gunicorn -c gunicorn.conf.py
+#
+# SMART_ATTEND_ROLE picks the worker layout (see DEPLOYMENT.md):
+#   api          roster/attendance endpoints, few processes, many threads
+#   recognition  /api/recognize, one HTTP process feeding a per-core recognition pool
+#   all          everything in one pool (small single-server installs)
+# WEB_WORKERS, WEB_THREADS, WEB_TIMEOUT, BIND and RECOGNITION_POOL_WORKERS
+# override the defaults. Each HTTP worker owns its own recognition pool.
+import gc
+import multiprocessing
+import os
+
+role = os.environ.get("SMART_ATTEND_ROLE", "all")
+cores = multiprocessing.cpu_count()
+
+if role == "recognition":
+    default_workers, default_threads, default_bind = 1, 16, "0.0.0.0:5001"
+    os.environ.setdefault("RECOGNITION_POOL_WORKERS", str(cores))
+elif role == "api":
+    default_workers, default_threads, default_bind = 2, 8, "0.0.0.0:5000"
+else:
+    default_workers, default_threads, default_bind = 2, 8, "0.0.0.0:5000"
+    os.environ.setdefault("RECOGNITION_POOL_WORKERS", str(max(1, cores // 2)))
+
+wsgi_app = "wsgi:app"
+bind = os.environ.get("BIND", default_bind)
+workers = int(os.environ.get("WEB_WORKERS", default_workers))
+threads = int(os.environ.get("WEB_THREADS", default_threads))
+worker_class = "gthread"
+timeout = int(os.environ.get("WEB_TIMEOUT", 60))
+graceful_timeout = 30
+keepalive = 5
+
+# Import the app (and encode the gallery) once in the master before forking
+preload_app = True
+
+
+def pre_fork(server, worker):
+    # Move everything allocated so far out of the collector's reach so
+    # workers don't dirty the shared pages (and copy them) during GC passes.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if role == "api":
+        return
+    # TensorFlow and dlib are not fork-safe, so each worker spawns its own
+    # recognition pool after the fork; /api/health is 503 until it is warm.
+    from app import recognition_pool
+    recognition_pool.start()
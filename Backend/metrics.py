@@ -0,0 +1,98 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds of the latency buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class StageTimer:
+    """
+    Collects per-stage wall-clock times (in milliseconds) for one request.
+    """
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name, ms):
+        self.timings[name] = self.timings.get(name, 0.0) + ms
+
+    def merge(self, timings):
+        for name, ms in timings.items():
+            self.add(name, ms)
+
+    def rounded(self):
+        return {name: round(ms, 2) for name, ms in self.timings.items()}
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus exposition model, one
+    series per label value. Observing is a bisect and two additions under a
+    lock, cheap enough to leave on for every request.
+    """
+
+    def __init__(self, name, help_text, label, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        for label_value, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{self.label}="{label_value}",le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{self.label}="{label_value}",le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{self.label}="{label_value}"}} {total:.6f}')
+            lines.append(f'{self.name}_count{{{self.label}="{label_value}"}} {cumulative}')
+        return lines
+
+
+recognition_stages = Histogram(
+    "recognition_stage_seconds", "Time spent in each stage of the recognition pipeline.", "stage")
+
+
+def observe_stages(timings):
+    """
+    Feeds a request's StageTimer timings (milliseconds) into the histograms.
+    """
+    for stage, ms in timings.items():
+        recognition_stages.observe(stage, ms / 1000)
+
+
+def render(gauges=(), counters=()):
+    """
+    Returns the Prometheus text exposition of the stage histograms plus the
+    given (name, help, value) gauges and counters, which callers read from
+    the objects that already keep them (pool, motion gate, gallery).
+    """
+    lines = recognition_stages.render()
+    for kind, samples in (("gauge", gauges), ("counter", counters)):
+        for name, help_text, value in samples:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
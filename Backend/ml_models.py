@@ -0,0 +1,97 @@
+import importlib
+import threading
+import time
+
+import numpy as np
+
+# face_recognition pulls in dlib and its models, DeepFace pulls in TensorFlow.
+# They are imported on first use so processes that only serve roster and
+# attendance endpoints never pay for them.
+_modules = {}
+_lock = threading.Lock()
+
+
+def _load(name):
+    module = _modules.get(name)
+    if module is None:
+        with _lock:
+            module = _modules.get(name)
+            if module is None:
+                module = importlib.import_module(name)
+                _modules[name] = module
+    return module
+
+
+def get_cv2():
+    return _load("cv2")
+
+
+def get_face_recognition():
+    return _load("face_recognition")
+
+
+def get_deepface():
+    """
+    Returns the deepface.DeepFace module, as used by `DeepFace.analyze`.
+    The package's __init__ does not import it, so it is loaded by name.
+    """
+    return _load("deepface.DeepFace")
+
+
+def is_loaded(name):
+    """
+    Reports whether a heavy module has been imported in this process yet.
+    """
+    return name in _modules
+
+
+# ----------------------------
+# Warm-up and readiness
+# ----------------------------
+_warm_up_state = {"state": "cold", "seconds": None, "error": None}
+_warm_up_thread = None
+
+
+def warm_up(detector_factory=None):
+    """
+    Loads the detector, encoder and emotion model and runs one dummy
+    inference through each, so the first real request doesn't pay for
+    model construction or graph tracing. `detector_factory` returns the
+    configured face detector; dlib's default HOG detector is used without it.
+    """
+    _warm_up_state.update(state="warming", error=None)
+    start = time.perf_counter()
+    try:
+        get_cv2()
+        face_recognition = get_face_recognition()
+        dummy = np.zeros((160, 160, 3), dtype=np.uint8)
+        detect = detector_factory() if detector_factory else face_recognition.face_locations
+        detect(dummy)
+        # Pass an explicit box so the encoder runs even though there is no face
+        face_recognition.face_encodings(dummy, [(0, 160, 160, 0)])
+        get_deepface().analyze(dummy, actions=['emotion'], enforce_detection=False)
+    except Exception as e:
+        _warm_up_state.update(state="failed", error=str(e))
+        print(f"Model warm-up failed: {e}")
+        return False
+
+    _warm_up_state.update(state="ready", seconds=round(time.perf_counter() - start, 2))
+    print(f"Models warmed up in {_warm_up_state['seconds']}s")
+    return True
+
+
+def start_warm_up(detector_factory=None):
+    """
+    Runs warm_up on a background thread once per process.
+    """
+    global _warm_up_thread
+    with _lock:
+        if _warm_up_thread is None or (_warm_up_state["state"] == "failed" and not _warm_up_thread.is_alive()):
+            _warm_up_thread = threading.Thread(target=warm_up, args=(detector_factory,),
+                                               name="model-warm-up", daemon=True)
+            _warm_up_thread.start()
+    return _warm_up_thread
+
+
+def warm_up_status():
+    return dict(_warm_up_state)
@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import ml_models
+
+
+JPEG_MAGIC = b"\xff\xd8\xff"
+
+
+def frame_fingerprint(img_bytes, size=64):
+    """
+    Returns a tiny grayscale thumbnail of an encoded frame, or None if it
+    can't be made cheaply. JPEGs are decoded at quarter resolution straight
+    from the DCT, so this costs a fraction of a full decode. Other formats
+    would need a full decode on top of the pool's, so they aren't gated.
+    """
+    if not img_bytes.startswith(JPEG_MAGIC):
+        return None
+    cv2 = ml_models.get_cv2()
+    try:
+        gray = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    except cv2.error:
+        return None
+    if gray is None:
+        return None
+    return cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+class MotionGate:
+    """
+    Skips recognition for frames that match the camera's last analyzed frame.
+
+    Each camera keeps the fingerprint and result of its last fully processed
+    frame (the keyframe). A new frame is "unchanged" when fewer than
+    `changed_fraction` of its thumbnail pixels differ from the keyframe by
+    more than `pixel_delta` grey levels. Comparing against the keyframe
+    rather than the previous frame means slow drift still adds up to a
+    change. Results older than `max_age` seconds are always recomputed.
+    """
+
+    def __init__(self, pixel_delta=20, changed_fraction=0.005, max_age=30.0, max_cameras=1024):
+        self.pixel_delta = pixel_delta
+        self.changed_fraction = changed_fraction
+        self.max_age = max_age
+        self.max_cameras = max_cameras
+        self._keyframes = OrderedDict()
+        self._lock = threading.Lock()
+        self.skipped = 0
+        self.processed = 0
+
+    def check(self, camera_id, fingerprint):
+        """
+        Returns the cached result if the frame is unchanged, else None.
+        """
+        if fingerprint is None:
+            return None
+        with self._lock:
+            keyframe = self._keyframes.get(camera_id)
+            if keyframe is not None:
+                created, previous, result = keyframe
+                if (time.monotonic() - created <= self.max_age and previous.shape == fingerprint.shape
+                        and np.mean(np.abs(fingerprint - previous) > self.pixel_delta) < self.changed_fraction):
+                    self.skipped += 1
+                    return result
+            self.processed += 1
+        return None
+
+    def remember(self, camera_id, fingerprint, result):
+        if fingerprint is None:
+            return
+        with self._lock:
+            self._keyframes[camera_id] = (time.monotonic(), fingerprint, result)
+            self._keyframes.move_to_end(camera_id)
+            while len(self._keyframes) > self.max_cameras:
+                self._keyframes.popitem(last=False)
+
+    def forget(self, camera_id=None):
+        """
+        Drops the keyframe of one camera, or of all cameras (e.g. after the
+        gallery or a camera's ROI changes).
+        """
+        with self._lock:
+            if camera_id is None:
+                self._keyframes.clear()
+            else:
+                self._keyframes.pop(camera_id, None)
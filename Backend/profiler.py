@@ -0,0 +1,138 @@
+"""
+On-demand sampling profiler for the recognition path.
+
+Nothing samples while profiling is off; pool workers only keep one thread
+blocked on an event. During a profile a sampler snapshots the other threads'
+stacks every `interval` seconds with sys._current_frames() and counts each
+stack that passes through recognition code. The result is
+collapsed-stack text ("frame;frame;frame count" per line) that flamegraph.pl,
+speedscope and similar tools read directly.
+
+Profile a running server (the endpoint needs PROFILER_TOKEN to be set):
+
+    python profiler.py --url http://127.0.0.1:5001 --seconds 10 --token $PROFILER_TOKEN -o recognize.folded
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import urllib.request
+from collections import Counter
+
+# Stacks are kept only if they pass through one of these functions, and are
+# trimmed to start at the outermost one (dropping the Flask/executor frames)
+HTTP_SCOPE = {"recognize_face", "recognize_faces_batch", "identify_faces"}
+WORKER_SCOPE = {"analyze_frame", "analyze_frames"}
+
+MAX_SECONDS = 60
+MIN_INTERVAL = 0.001
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Samples the stacks of the current process's threads (optionally only
+    `thread_ids`) and counts the ones inside `scope`.
+    """
+
+    def __init__(self, scope, interval=0.005, label=None, thread_ids=None):
+        self.scope = scope
+        self.interval = max(MIN_INTERVAL, interval)
+        self.label = label
+        self.thread_ids = thread_ids
+        self.stacks = Counter()
+        self.samples = 0
+
+    def sample(self):
+        own_id = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                continue
+            codes = []
+            while frame is not None:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            codes.reverse()
+            root = next((i for i, code in enumerate(codes) if code.co_name in self.scope), None)
+            if root is None:
+                continue
+            labels = [_frame_label(code) for code in codes[root:]]
+            if self.label:
+                labels.insert(0, self.label)
+            self.stacks[";".join(labels)] += 1
+        self.samples += 1
+
+    def run(self, seconds):
+        """
+        Samples on the calling thread for `seconds` and returns the stack counts.
+        """
+        deadline = time.monotonic() + min(seconds, MAX_SECONDS)
+        while time.monotonic() < deadline:
+            self.sample()
+            time.sleep(self.interval)
+        return self.stacks
+
+
+def collapsed(stacks):
+    """
+    Renders stack counts as collapsed-stack text, hottest first.
+    """
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def watch_profile_requests(channel):
+    """
+    Runs in every recognition pool process (started by the pool's worker
+    initializer). Blocks on the channel's event until a profile is
+    requested, samples the process's main thread, where the executor runs
+    analyze_frame, and sends (generation, stacks) back to the HTTP process.
+    """
+    request, window, results = channel
+    main_id = threading.main_thread().ident
+    label = f"worker-{os.getpid()}"
+    last_generation = 0
+    while True:
+        request.wait()
+        generation, deadline, interval = window[:]
+        if generation == last_generation:
+            # Already profiled this window; wait for the HTTP process to clear the event
+            time.sleep(max(0.05, deadline - time.time()))
+            continue
+        last_generation = generation
+        sampler = StackSampler(WORKER_SCOPE, interval, label, {main_id})
+        results.put((generation, sampler.run(max(0.0, deadline - time.time()))))
+
+
+def start_watcher(channel):
+    threading.Thread(target=watch_profile_requests, args=(channel,), name="profile-watcher", daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--interval-ms", type=float, default=5)
+    parser.add_argument("--token", default=os.environ.get("PROFILER_TOKEN"))
+    parser.add_argument("-o", "--output", help="write the collapsed stacks here instead of stdout")
+    args = parser.parse_args()
+    if not args.token:
+        raise SystemExit("Pass --token or set PROFILER_TOKEN")
+
+    url = f"{args.url.rstrip('/')}/api/admin/profile?seconds={args.seconds}&interval_ms={args.interval_ms}"
+    req = urllib.request.Request(url, method="POST", headers={"X-Admin-Token": args.token})
+    with urllib.request.urlopen(req, timeout=args.seconds + 30) as response:
+        body = response.read().decode()
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(body)
+        print(f"Wrote {len(body.splitlines())} stacks to {args.output}")
+    else:
+        sys.stdout.write(body)
+
+
+if __name__ == "__main__":
+    main()
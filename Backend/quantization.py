@@ -0,0 +1,127 @@
+import os
+import tempfile
+
+import numpy as np
+
+# Rows per block when expanding codes, bounding the temporary float copy
+BLOCK_ROWS = 16384
+
+
+def map_read_only(matrix):
+    """
+    Moves a float32 matrix into an unlinked temporary file and returns a
+    read-only memory map of it. Only the rows that are actually read become
+    resident, and forked workers share them through the page cache.
+    """
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    if not matrix.size:
+        return matrix
+    fd, path = tempfile.mkstemp(prefix="gallery-", suffix=".f32")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            matrix.tofile(f)
+        return np.memmap(path, dtype=np.float32, mode="r", shape=matrix.shape)
+    finally:
+        os.unlink(path)
+
+
+class ScalarQuantizer:
+    """
+    Symmetric per-dimension int8 codes: 128 bytes per 128-d encoding.
+    """
+
+    def __init__(self, scale):
+        self.scale = scale.astype(np.float32)
+
+    @classmethod
+    def fit(cls, encodings):
+        peak = np.abs(encodings).max(axis=0) if len(encodings) else np.ones(encodings.shape[1])
+        return cls(np.where(peak > 0, peak / 127.0, 1.0))
+
+    def encode(self, encodings):
+        return np.clip(np.rint(encodings / self.scale), -127, 127).astype(np.int8)
+
+    def code_norms(self, codes):
+        decoded = codes.astype(np.float32) * self.scale
+        return np.einsum('ij,ij->i', decoded, decoded)
+
+    def squared_distances(self, queries, codes, code_norms):
+        """
+        Approximate squared distances (M, N) from float queries to coded rows.
+        """
+        scaled = queries * self.scale
+        query_norms = np.einsum('ij,ij->i', queries, queries)[:, None]
+        out = np.empty((len(queries), len(codes)), np.float32)
+        for start in range(0, len(codes), BLOCK_ROWS):
+            block = codes[start:start + BLOCK_ROWS].astype(np.float32)
+            out[:, start:start + BLOCK_ROWS] = (query_norms + code_norms[None, start:start + BLOCK_ROWS]
+                                                - 2.0 * scaled @ block.T)
+        return out
+
+    def nbytes(self):
+        return self.scale.nbytes
+
+
+class ProductQuantizer:
+    """
+    Product quantization: the 128 dimensions are split into `subspaces`
+    groups and each group is replaced by the id of its nearest of 256
+    k-means centroids, so an encoding costs `subspaces` bytes. Distances are
+    looked up per group from a small query-to-centroid table (asymmetric
+    distance computation).
+    """
+
+    def __init__(self, centroids):
+        # (subspaces, centroids per subspace, dims per subspace)
+        self.centroids = centroids.astype(np.float32)
+
+    @classmethod
+    def fit(cls, encodings, subspaces=16, clusters=256, iterations=10, sample=10000, seed=0):
+        rng = np.random.default_rng(seed)
+        if len(encodings) > sample:
+            encodings = encodings[rng.choice(len(encodings), sample, replace=False)]
+        encodings = np.asarray(encodings, np.float32)
+        clusters = max(1, min(clusters, len(encodings)))
+        groups = np.split(encodings, subspaces, axis=1)
+        centroids = np.stack([cls._kmeans(group, clusters, iterations, rng) for group in groups])
+        return cls(centroids)
+
+    @staticmethod
+    def _kmeans(points, clusters, iterations, rng):
+        centroids = points[rng.choice(len(points), clusters, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = ProductQuantizer._nearest(points, centroids)
+            sums = np.stack([np.bincount(assignment, weights=points[:, dim], minlength=clusters)
+                             for dim in range(points.shape[1])], axis=1)
+            counts = np.bincount(assignment, minlength=clusters)[:, None]
+            # Empty clusters keep their previous centroid
+            centroids = np.where(counts > 0, sums / np.maximum(counts, 1), centroids).astype(np.float32)
+        return centroids
+
+    @staticmethod
+    def _nearest(points, centroids):
+        squared = (np.einsum('ij,ij->i', centroids, centroids)[None, :] - 2.0 * points @ centroids.T)
+        return squared.argmin(axis=1)
+
+    def encode(self, encodings):
+        groups = np.split(np.asarray(encodings, np.float32), len(self.centroids), axis=1)
+        return np.stack([self._nearest(group, centroids) for group, centroids in zip(groups, self.centroids)],
+                        axis=1).astype(np.uint8)
+
+    def code_norms(self, codes):
+        return None
+
+    def squared_distances(self, queries, codes, code_norms=None):
+        groups = np.split(np.asarray(queries, np.float32), len(self.centroids), axis=1)
+        # (subspaces, M, centroids): squared distance of each query group to each centroid
+        tables = np.stack([
+            ((group[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2)
+            for group, centroids in zip(groups, self.centroids)
+        ])
+        out = np.zeros((len(queries), len(codes)), np.float32)
+        for subspace, table in enumerate(tables):
+            out += table[:, codes[:, subspace]]
+        return out
+
+    def nbytes(self):
+        return self.centroids.nbytes
@@ -0,0 +1,341 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+import camera_roi
+import detectors
+import ml_models
+import profiler
+
+
+class PoolSaturated(Exception):
+    """
+    Raised when every worker is busy and the job queue is full.
+    """
+
+    def __init__(self, retry_after):
+        super().__init__(f"Recognition pool is saturated, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def detect_emotion(face_img):
+    """
+    Returns the dominant emotion of a face crop, or "Neutral" if DeepFace fails.
+    """
+    try:
+        if face_img.size > 0:
+            # DeepFace requires a path or a numpy array
+            demography = ml_models.get_deepface().analyze(face_img, actions=['emotion'], enforce_detection=False)
+            if demography and 'emotion' in demography[0]:
+                return max(demography[0]['emotion'], key=demography[0]['emotion'].get)
+    except Exception as e:
+        print(f"DeepFace analysis failed: {e}")
+    return "Neutral"
+
+
+def analyze_frame(img_bytes, submitted_at=None, roi=None):
+    """
+    The CPU-heavy half of recognition: decodes an encoded image, detects and
+    encodes faces and runs emotion analysis on each crop. Matching against
+    the gallery and DB writes stay in the HTTP process. With `roi` polygons
+    detection only scans those regions of the frame.
+
+    Returns {"error", "size", "faces": [{"box", "encoding", "emotion"}],
+    "timings"} with per-stage timings in milliseconds.
+    """
+    timings = {}
+    if submitted_at is not None:
+        timings["queue"] = (time.time() - submitted_at) * 1000
+
+    cv2 = ml_models.get_cv2()
+    face_recognition = ml_models.get_face_recognition()
+
+    if not img_bytes:
+        return {"error": "Invalid image data: the image is empty.", "size": None, "faces": [], "timings": timings}
+
+    start = time.perf_counter()
+    try:
+        img = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR)
+    except cv2.error as e:
+        return {"error": f"Invalid image data: {str(e).strip()}", "size": None, "faces": [], "timings": timings}
+    stage = time.perf_counter()
+    timings["decode"] = (stage - start) * 1000
+    if img is None:
+        return {"error": "Could not decode image.", "size": None, "faces": [], "timings": timings}
+
+    rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    now = time.perf_counter()
+    timings["convert"], stage = (now - stage) * 1000, now
+
+    if roi:
+        face_locations = camera_roi.detect_in_roi(detectors.get_detector(), rgb_img, roi)
+    else:
+        face_locations = detectors.get_detector()(rgb_img)
+    now = time.perf_counter()
+    timings["detect"], stage = (now - stage) * 1000, now
+
+    face_encodings = face_recognition.face_encodings(rgb_img, face_locations)
+    now = time.perf_counter()
+    timings["encode"], stage = (now - stage) * 1000, now
+
+    faces = []
+    for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
+        faces.append({
+            "box": (top, right, bottom, left),
+            "encoding": face_encoding,
+            "emotion": detect_emotion(img[top:bottom, left:right]),
+        })
+    timings["emotion"] = (time.perf_counter() - stage) * 1000
+
+    return {"error": None, "size": img.shape[:2], "faces": faces, "timings": timings}
+
+
+def analyze_frames(frames, submitted_at=None, roi=None):
+    """
+    Runs analyze_frame over a chunk of frames in one task, so a burst pays
+    the pool's dispatch and pickling overhead once per chunk. A frame that
+    fails gets an error result; the rest of the chunk is still analyzed.
+    """
+    results = []
+    for img_bytes in frames:
+        try:
+            results.append(analyze_frame(img_bytes, submitted_at, roi))
+        except Exception as e:
+            print(f"Frame analysis failed: {e}")
+            results.append({"error": f"Could not analyze frame: {e}", "size": None, "faces": [], "timings": {}})
+    return results
+
+
+_start_barrier = None
+
+
+def _init_worker(detector_config, profile_channel, start_barrier):
+    global _start_barrier
+    _start_barrier = start_barrier
+    profiler.start_watcher(profile_channel)
+    detectors.configure(detector_config)
+    ml_models.warm_up(detectors.get_detector)
+
+
+def _worker_status(timeout):
+    """
+    Start-up probe: reports this worker's warm-up state once every worker
+    holds a probe. The barrier keeps a worker from taking a second probe,
+    so each one lands on a different process.
+    """
+    status = ml_models.warm_up_status()
+    try:
+        _start_barrier.wait(timeout)
+    except threading.BrokenBarrierError:
+        return {"state": "failed", "error": "Not every recognition worker started within the time limit"}
+    return status
+
+
+class RecognitionPool:
+    """
+    Bounded process pool for analyze_frame.
+
+    At most `workers + queue_size` frames are admitted at once; submit()
+    raises PoolSaturated beyond that instead of letting requests pile up,
+    so the HTTP threads stay free for roster and attendance calls. Workers
+    are spawned (not forked) and build the configured face detector and warm
+    their own models on start. With workers=0 frames are analyzed inline on
+    the calling thread.
+    """
+
+    def __init__(self, workers, queue_size, retry_after=2, detector_config=None):
+        self.workers = workers
+        self.detector_config = detector_config or detectors.get_config()
+        self.capacity = max(1, workers) + queue_size
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._in_flight = 0
+        # (event, [generation, deadline, interval], result queue), created
+        # with the first executor so every forked server worker gets its own
+        self._profile_channel = None
+        self._start_barrier = None
+        self._pending_probes = 0
+        self._profile_lock = threading.Lock()
+        self.rejected = 0
+        self.ready = threading.Event()
+        self.error = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                context = multiprocessing.get_context("spawn")
+                if self._profile_channel is None:
+                    self._profile_channel = (context.Event(), context.Array('d', 3), context.Queue())
+                    self._start_barrier = context.Barrier(self.workers)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=context,
+                    initializer=_init_worker,
+                    initargs=(self.detector_config, self._profile_channel, self._start_barrier),
+                )
+            return self._executor
+
+    def start(self, timeout=600):
+        """
+        Spawns every worker and marks the pool ready once all of them have
+        warmed up. The executor only spawns a process when a task finds no
+        idle one, so one probe per worker is submitted at once.
+        Call it in the serving process after any fork, never before.
+        """
+        if self.workers == 0:
+            detectors.configure(self.detector_config)
+            ml_models.start_warm_up(detectors.get_detector)
+            return
+        executor = self._get_executor()
+        with self._lock:
+            self._pending_probes = self.workers
+            self.error = None
+        for _ in range(self.workers):
+            executor.submit(_worker_status, timeout).add_done_callback(self._probe_done)
+
+    def _probe_done(self, probe):
+        try:
+            status = probe.result()
+        except Exception as e:
+            status = {"state": "failed", "error": str(e)}
+        with self._lock:
+            if status["state"] != "ready" and self.error is None:
+                self.error = status["error"]
+            self._pending_probes -= 1
+            if self._pending_probes == 0 and self.error is None:
+                self.ready.set()
+
+    def is_ready(self):
+        if self.workers == 0:
+            return ml_models.warm_up_status()["state"] == "ready"
+        return self.ready.is_set()
+
+    def _acquire(self, count):
+        acquired = 0
+        while acquired < count and self._slots.acquire(blocking=False):
+            acquired += 1
+        if acquired < count:
+            for _ in range(acquired):
+                self._slots.release()
+            with self._lock:
+                self.rejected += 1
+            raise PoolSaturated(self.retry_after)
+        with self._lock:
+            self._in_flight += count
+
+    def _release(self, future, count=1):
+        with self._lock:
+            self._in_flight -= count
+            # A crashed worker breaks the whole executor; start a fresh one next time
+            if future is not None and not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+                self._executor = None
+        for _ in range(count):
+            self._slots.release()
+
+    def _submit(self, fn, payload, count, roi=None):
+        if self.workers == 0:
+            future = Future()
+            try:
+                future.set_result(fn(payload, time.time(), roi))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            try:
+                future = self._get_executor().submit(fn, payload, time.time(), roi)
+            except Exception:
+                self._release(None, count)
+                raise
+        future.add_done_callback(lambda done: self._release(done, count))
+        return future
+
+    def submit(self, img_bytes, roi=None):
+        """
+        Queues a frame and returns a Future of analyze_frame's result.
+        """
+        self._acquire(1)
+        return self._submit(analyze_frame, img_bytes, 1, roi)
+
+    def submit_batch(self, frames, roi=None):
+        """
+        Queues a burst of frames, split into one chunk per worker so they are
+        decoded and analyzed in parallel. Admission is all-or-nothing: either
+        every frame gets a slot or PoolSaturated is raised. Returns a list of
+        (start_index, Future of a list of analyze_frame results).
+        """
+        if len(frames) > self.capacity:
+            raise ValueError(f"A batch can hold at most {self.capacity} frames.")
+        self._acquire(len(frames))
+
+        chunk_count = max(1, min(self.workers, len(frames)))
+        chunk_size = -(-len(frames) // chunk_count)
+        chunks = []
+        for start in range(0, len(frames), chunk_size):
+            chunk = frames[start:start + chunk_size]
+            try:
+                chunks.append((start, self._submit(analyze_frames, chunk, len(chunk), roi)))
+            except Exception:
+                # Give back the slots of the chunks that were never submitted
+                self._release(None, len(frames) - start - len(chunk))
+                raise
+        return chunks
+
+    def profile(self, seconds, interval, sample_here):
+        """
+        Samples every pool process for `seconds` while `sample_here(seconds)`
+        profiles the calling process, and returns the stack Counters of all
+        of them. Raises RuntimeError if a profile is already running.
+        """
+        if not self._profile_lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running.")
+        try:
+            if self.workers == 0 or self._profile_channel is None:
+                return [sample_here(seconds)]
+
+            request, window, results = self._profile_channel
+            generation = window[0] + 1
+            window[:] = [generation, time.time() + seconds, interval]
+            request.set()
+            try:
+                profiles = [sample_here(seconds)]
+            finally:
+                request.clear()
+
+            # Workers busy in a long frame report once it is sampled out; don't wait forever
+            deadline = time.monotonic() + 2.0
+            reported = 0
+            while reported < self.workers and time.monotonic() < deadline:
+                try:
+                    result_generation, stacks = results.get(timeout=max(0.0, deadline - time.monotonic()))
+                except Exception:
+                    break
+                if result_generation == generation:
+                    profiles.append(stacks)
+                    reported += 1
+            return profiles
+        finally:
+            self._profile_lock.release()
+
+    def status(self):
+        with self._lock:
+            in_flight = self._in_flight
+        return {
+            "state": "ready" if self.is_ready() else ("failed" if self.error else "starting"),
+            "error": self.error,
+            "workers": self.workers,
+            "detector": self.detector_config["name"],
+            "capacity": self.capacity,
+            "inFlight": in_flight,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,54 @@
+import hashlib
+import threading
+import time
+
+
+def body_etag(body):
+    """
+    Returns a short content hash of a response body for use as an ETag.
+    """
+    return hashlib.blake2b(body, digest_size=8).hexdigest()
+
+
+class RosterResponseCache:
+    """
+    Caches serialized /api/students responses per (class, section) filter.
+
+    Each entry remembers the roster version it was built from and is rebuilt
+    as soon as that version moves on. The version is read from the database
+    on every request, so a change made by another worker process is seen
+    straight away; the TTL only bounds how long an entry is kept.
+    """
+
+    def __init__(self, version_source, ttl=300.0):
+        self.version_source = version_source
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, builder):
+        """
+        Returns (body, etag) for `key`, calling `builder()` to produce fresh
+        JSON bytes only when the cached entry is missing or stale.
+        """
+        version = self.version_source()
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_version, created, body, etag = entry
+                if entry_version == version and now - created <= self.ttl:
+                    return body, etag
+
+        body = builder()
+        etag = body_etag(body)
+        with self._lock:
+            # A write that landed while we were building makes this stale
+            if self.version_source() == version:
+                self._entries[key] = (version, now, body, etag)
+        return body, etag
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
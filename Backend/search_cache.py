@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_query(query):
+    """
+    Normalizes a search query the same way SQLite's LIKE compares it.
+    LIKE is case-insensitive for ASCII only, so non-ASCII queries are kept as-is.
+    """
+    query = query or ''
+    return query.lower() if query.isascii() else query
+
+
+def row_matches(row, query):
+    """
+    In-memory equivalent of `name LIKE %q% OR reg_no LIKE %q%` for a
+    (id, name, reg_no, class, section, photo_path) row.
+    """
+    for value in (row[1], row[2]):
+        if value is None:
+            continue
+        if query.isascii():
+            value = value.lower()
+        if query in value:
+            return True
+    return False
+
+
+class StudentSearchCache:
+    """
+    LRU cache of student search results keyed on the normalized query.
+
+    Entries expire after `ttl` seconds and the whole cache is dropped on
+    student writes, including those made by other processes when
+    `version_source` returns a roster version that has moved on. A query that extends a cached query is answered by
+    filtering the cached rows instead of going back to SQLite, since the
+    matches for "sub" always contain the matches for "subh".
+    """
+
+    def __init__(self, max_entries=256, ttl=60.0, version_source=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version_source = version_source
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._version = None
+        self.hits = 0
+        self.prefix_hits = 0
+        self.misses = 0
+
+    def _lookup(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created, rows = entry
+        if now - created > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, created, rows):
+        self._entries[key] = (created, rows)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, query, loader):
+        """
+        Returns the rows matching `query`, calling `loader(query)` only when
+        neither the query nor one of its prefixes is cached.
+        """
+        key = normalize_query(query)
+        now = time.monotonic()
+        version = self.version_source() if self.version_source else None
+
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._generation += 1
+                self._version = version
+
+            entry = self._lookup(key, now)
+            if entry is not None:
+                self.hits += 1
+                return entry[1]
+
+            # '%' and '_' are LIKE wildcards, so only plain text can be
+            # derived from a shorter cached result.
+            if '%' not in key and '_' not in key:
+                for length in range(len(key) - 1, -1, -1):
+                    entry = self._lookup(key[:length], now)
+                    if entry is None:
+                        continue
+                    rows = [row for row in entry[1] if row_matches(row, key)]
+                    # Keep the parent's timestamp so derived rows never outlive it
+                    self._store(key, entry[0], rows)
+                    self.prefix_hits += 1
+                    return rows
+
+            self.misses += 1
+            generation = self._generation
+
+        rows = loader(query)
+        with self._lock:
+            # Don't cache a result that raced with an invalidation
+            if generation == self._generation:
+                self._store(key, now, rows)
+        return rows
+
+    def invalidate(self):
+        """
+        Drops every cached result, e.g. after a student is added or removed.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
@@ -1,15 +1,270 @@
-import requests
+"""
+Load generator for /api/recognize: N simulated classroom cameras replay
+the photos in demo_photos/ and known_faces/ at a fixed frame rate against a
+running server, then report throughput, latency percentiles, error rates
+and attendance write rates.
+
+    python test_attendance.py [--url http://localhost:5000] [--cameras 8] [--fps 2]
+        [--duration 30] [--warmup 5] [--images demo_photos,known_faces] [--start-server]
+        [--no-camera-id] [--timings] [--json]
+
+Each camera has one request in flight at a time, on a fixed schedule of one
+frame every 1/fps seconds. After a slow response the frames that fell due
+meanwhile go out back to back. Latency is measured from the time a frame
+was due, not from when it was sent, so time spent waiting behind a slow
+server counts against that server (no coordinated omission); the service
+time from the actual send is reported separately. An overloaded server
+also shows up as lower achieved fps and more 429s. With --start-server,
+gunicorn is started locally with
+gunicorn.conf.py (SMART_ATTEND_ROLE and friends apply) and stopped at the
+end.
+"""
+import argparse
 import base64
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from urllib.parse import urlparse
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def load_images(directories):
+    """
+    Returns every photo under the given directories, base64-encoded once up front.
+    """
+    images = []
+    for directory in directories:
+        directory = os.path.join(BACKEND_DIR, directory)
+        for root, _dirs, files in sorted(os.walk(directory)):
+            for filename in sorted(files):
+                if filename.endswith(IMAGE_EXTENSIONS):
+                    with open(os.path.join(root, filename), 'rb') as f:
+                        images.append(base64.b64encode(f.read()).decode())
+    return images
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def count_attendance(url):
+    """
+    Returns today's attendance row count as reported by the server.
+    """
+    today = datetime.now().strftime("%Y-%m-%d")
+    try:
+        response = requests.get(f"{url}/api/attendance", params={"date": today}, timeout=30)
+        return len(response.json().get("data", []))
+    except (requests.RequestException, ValueError):
+        return None
+
+
+class Camera(threading.Thread):
+    """
+    One simulated camera: sends its frames on a fixed schedule and records
+    (due_at, latency_s, service_s, status, body) for every request, with
+    latency counted from due_at and service time from the actual send.
+    """
+
+    def __init__(self, index, url, images, fps, deadline, camera_id, timings):
+        super().__init__(name=f"camera-{index}", daemon=True)
+        self.url = f"{url}/api/recognize" + ("?timings=1" if timings else "")
+        self.images = images[index % len(images):] + images[:index % len(images)]
+        self.interval = 1.0 / fps
+        self.deadline = deadline
+        self.camera_id = camera_id
+        self.samples = []
+
+    def run(self):
+        session = requests.Session()
+        next_frame = time.monotonic()
+        frame = 0
+        while True:
+            now = time.monotonic()
+            if now >= self.deadline:
+                break
+            if now < next_frame:
+                time.sleep(next_frame - now)
+            due_at = next_frame
+            payload = {"image": self.images[frame % len(self.images)]}
+            if self.camera_id:
+                payload["cameraId"] = self.camera_id
+            sent_at = time.monotonic()
+            try:
+                response = session.post(self.url, json=payload, timeout=60)
+                status = response.status_code
+                try:
+                    body = response.json()
+                except ValueError:
+                    body = None
+            except requests.RequestException as e:
+                status, body = type(e).__name__, None
+            done = time.monotonic()
+            self.samples.append((due_at, done - due_at, done - sent_at, status, body))
+            frame += 1
+            next_frame += self.interval
+
+
+def start_server(url):
+    """
+    Starts gunicorn with the production config on the URL's port and waits
+    until /api/health reports ready.
+    """
+    parsed = urlparse(url)
+    env = dict(os.environ, BIND=f"{parsed.hostname}:{parsed.port or 80}")
+    server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"], cwd=BACKEND_DIR, env=env)
+    deadline = time.monotonic() + 300
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"gunicorn exited with status {server.returncode}")
+        try:
+            if requests.get(f"{url}/api/health", timeout=2).status_code == 200:
+                return server
+        except requests.RequestException:
+            pass
+        time.sleep(1)
+    server.terminate()
+    raise SystemExit("Server did not become ready within 300 s")
+
+
+def summarize(cameras, started, warmup, duration, fps, rows_before, rows_after, collect_timings):
+    """
+    Aggregates the samples answered after the warm-up period.
+    """
+    samples = [sample for camera in cameras for sample in camera.samples if sample[0] + sample[1] >= started + warmup]
+    statuses = Counter(str(status) for _due, _latency, _service, status, _body in samples)
+    ok = [(latency, service, body) for _due, latency, service, status, body in samples
+          if status == 200 and body and body.get("success")]
+    latencies_ms = [latency * 1000 for latency, _service, _body in ok]
+    service_ms = [service * 1000 for _latency, service, _body in ok]
+    measured = duration - warmup
+
+    faces = sum(len(body.get("detectedFaces", [])) for _latency, _service, body in ok)
+    identified = sum(1 for _latency, _service, body in ok for face in body.get("detectedFaces", []) if face.get("rollNumber") != "N/A")
+    report = {
+        "cameras": len(cameras),
+        "target_fps_per_camera": fps,
+        "measured_s": measured,
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / measured, 2),
+        "achieved_fps_per_camera": round(len(samples) / measured / len(cameras), 2),
+        "ok": len(ok),
+        "error_rate": round(1 - len(ok) / len(samples), 4) if samples else None,
+        "statuses": dict(statuses),
+        "unchanged_frames": sum(1 for _latency, _service, body in ok if body.get("unchanged")),
+        "latency_ms": {
+            "p50": percentile(latencies_ms, 50),
+            "p95": percentile(latencies_ms, 95),
+            "p99": percentile(latencies_ms, 99),
+            "max": max(latencies_ms) if latencies_ms else None,
+        },
+        "service_ms": {
+            "p50": percentile(service_ms, 50),
+            "p95": percentile(service_ms, 95),
+            "p99": percentile(service_ms, 99),
+            "max": max(service_ms) if service_ms else None,
+        },
+        "faces_per_s": round(faces / measured, 2),
+        "identified_per_s": round(identified / measured, 2),
+        # Rows cover the whole run including warm-up; each student is written once per day
+        "db_rows_written": None if rows_before is None or rows_after is None else rows_after - rows_before,
+    }
+    if report["db_rows_written"] is not None:
+        report["db_writes_per_s"] = round(report["db_rows_written"] / duration, 2)
+    for block in ("latency_ms", "service_ms"):
+        for key in ("p50", "p95", "p99", "max"):
+            if report[block][key] is not None:
+                report[block][key] = round(report[block][key], 1)
+
+    if collect_timings:
+        stages = {}
+        for _latency, _service, body in ok:
+            for stage, ms in (body.get("timings") or {}).items():
+                stages.setdefault(stage, []).append(ms)
+        report["server_stage_ms"] = {
+            stage: {"mean": round(sum(values) / len(values), 2), "p95": round(percentile(values, 95), 2)}
+            for stage, values in sorted(stages.items())
+        }
+    return report
+
+
+def print_report(report):
+    print(f"cameras            {report['cameras']} x {report['target_fps_per_camera']} fps target, "
+          f"{report['achieved_fps_per_camera']} fps achieved")
+    print(f"requests           {report['requests']} in {report['measured_s']} s "
+          f"({report['throughput_rps']} req/s), {report['ok']} ok")
+    print(f"error rate         {report['error_rate']}  statuses: {report['statuses']}")
+    latency = report["latency_ms"]
+    print(f"latency ms         p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}"
+          "  (from when each frame was due)")
+    service = report["service_ms"]
+    print(f"service ms         p50 {service['p50']}  p95 {service['p95']}  p99 {service['p99']}  max {service['max']}")
+    print(f"unchanged frames   {report['unchanged_frames']}")
+    print(f"faces/s            {report['faces_per_s']} detected, {report['identified_per_s']} identified")
+    if report["db_rows_written"] is not None:
+        print(f"db writes          {report['db_rows_written']} rows ({report['db_writes_per_s']} rows/s)")
+    for stage, values in report.get("server_stage_ms", {}).items():
+        print(f"  {stage:<16} mean {values['mean']:>9} ms  p95 {values['p95']:>9} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--cameras", type=int, default=8)
+    parser.add_argument("--fps", type=float, default=2.0, help="frames per second per camera")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds, including warm-up")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds excluded from the report")
+    parser.add_argument("--images", default="demo_photos,known_faces")
+    parser.add_argument("--start-server", action="store_true", help="start gunicorn locally for the run")
+    parser.add_argument("--no-camera-id", action="store_true", help="send frames without cameraId (no motion gate)")
+    parser.add_argument("--timings", action="store_true", help="collect the server's per-stage timings")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+    if args.cameras < 1 or args.fps <= 0:
+        parser.error("--cameras and --fps must be positive")
+    if not 0 <= args.warmup < args.duration:
+        parser.error("--warmup must be at least 0 and shorter than --duration")
+
+    images = load_images(args.images.split(","))
+    if not images:
+        raise SystemExit(f"No images found in {args.images}")
+
+    url = args.url.rstrip("/")
+    server = start_server(url) if args.start_server else None
+    try:
+        rows_before = count_attendance(url)
+        started = time.monotonic()
+        cameras = [Camera(i, url, images, args.fps, started + args.duration,
+                          None if args.no_camera_id else f"loadgen-{i}", args.timings)
+                   for i in range(args.cameras)]
+        for camera in cameras:
+            camera.start()
+        for camera in cameras:
+            camera.join()
+        rows_after = count_attendance(url)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=60)
 
-# Read the image and convert to base64
-with open('demo_photos/102.png', 'rb') as f:
-    image_data = base64.b64encode(f.read()).decode()
+    report = summarize(cameras, started, args.warmup, args.duration, args.fps, rows_before, rows_after, args.timings)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
 
-# Send the request
-response = requests.post(
-    'http://localhost:5000/api/recognize',
-    json={'image': image_data}
-)
 
-# Print the response
-print(response.json())
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+import os
+
+from app import create_app
+
+# "recognition" and "all" processes encode the gallery here, before gunicorn
+# forks, so every worker shares the same encoding matrix copy-on-write. The
+# photos are encoded in short-lived spawned processes, so the master never
+# imports dlib.
+# "api" processes only serve roster/attendance endpoints and skip it.
+ROLE = os.environ.get("SMART_ATTEND_ROLE", "all")
+
+app = create_app(preload_gallery=True, serve_recognition=ROLE != "api")